@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x62igfs.proto\x12\x05\x62igfs\"0\n\x08NodeInfo\x12\x0f\n\x07\x61\x64\x64ress\x18\x01 \x01(\t\x12\x13\n\x0b\x63hunk_count\x18\x02 \x01(\x05\"X\n\x12\x43hunkUploadRequest\x12\'\n\x08metadata\x18\x01 \x01(\x0b\x32\x13.bigfs.FileMetadataH\x00\x12\x0e\n\x04\x64\x61ta\x18\x02 \x01(\x0cH\x00\x42\t\n\x07\x63ontent\"=\n\x15\x43hunkDownloadResponse\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\x16\n\x0eis_final_chunk\x18\x02 \x01(\x08\"#\n\x0c\x46ileMetadata\x12\x13\n\x0bremote_path\x18\x01 \x01(\t\"\x1b\n\x0bPathRequest\x12\x0c\n\x04path\x18\x01 \x01(\t\"-\n\x0b\x46ileRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x0c\n\x04size\x18\x02 \x01(\x03\"o\n\x10\x46ileListResponse\x12/\n\x05\x66iles\x18\x01 \x03(\x0b\x32 .bigfs.FileListResponse.FileInfo\x1a*\n\x08\x46ileInfo\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x0c\n\x04size\x18\x02 \x01(\x03\"S\n\x14\x46ileLocationResponse\x12\x12\n\nis_sharded\x18\x01 \x01(\x08\x12\'\n\tlocations\x18\x02 \x03(\x0b\x32\x14.bigfs.ChunkLocation\"i\n\rChunkLocation\x12\x13\n\x0b\x63hunk_index\x18\x01 \x01(\x05\x12\x10\n\x08\x63hunk_id\x18\x02 \x01(\t\x12\x17\n\x0fprimary_node_id\x18\x03 \x01(\t\x12\x18\n\x10replica_node_ids\x18\x04 \x03(\t\" \n\x0c\x43hunkRequest\x12\x10\n\x08\x63hunk_id\x18\x01 \x01(\t\"A\n\x05\x43hunk\x12\x10\n\x08\x63hunk_id\x18\x01 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\x12\x18\n\x10replica_node_ids\x18\x03 \x03(\t\"2\n\x0eSimpleResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"e\n\x12RemoveFileResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x16\n\x0eremoved_chunks\x18\x03 \x03(\t\x12\x15\n\rfailed_chunks\x18\x04 \x03(\t2\x89\x02\n\x0eGatewayService\x12@\n\nUploadFile\x12\x19.bigfs.ChunkUploadRequest\x1a\x15.bigfs.SimpleResponse(\x01\x12\x42\n\x0c\x44ownloadFile\x12\x12.bigfs.FileRequest\x1a\x1c.bigfs.ChunkDownloadResponse0\x01\x12\x38\n\tListFiles\x12\x12.bigfs.PathRequest\x1a\x17.bigfs.FileListResponse\x12\x37\n\nRemoveFile\x12\x12.bigfs.FileRequest\x1a\x15.bigfs.SimpleResponse2\xcf\x02\n\x0fMetadataService\x12\x38\n\x0cRegisterNode\x12\x0f.bigfs.NodeInfo\x1a\x15.bigfs.SimpleResponse\"\x00\x12\x44\n\x0fGetFileLocation\x12\x12.bigfs.FileRequest\x1a\x1b.bigfs.FileLocationResponse\"\x00\x12\x41\n\x0cGetWritePlan\x12\x12.bigfs.FileRequest\x1a\x1b.bigfs.FileLocationResponse\"\x00\x12:\n\tListFiles\x12\x12.bigfs.PathRequest\x1a\x17.bigfs.FileListResponse\"\x00\x12=\n\nRemoveFile\x12\x12.bigfs.FileRequest\x1a\x19.bigfs.RemoveFileResponse\"\x00\x32\xb8\x01\n\x0eStorageService\x12\x33\n\nStoreChunk\x12\x0c.bigfs.Chunk\x1a\x15.bigfs.SimpleResponse\"\x00\x12\x34\n\rRetrieveChunk\x12\x13.bigfs.ChunkRequest\x1a\x0c.bigfs.Chunk\"\x00\x12;\n\x0bRemoveChunk\x12\x13.bigfs.ChunkRequest\x1a\x15.bigfs.SimpleResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0b\x62igfs.proto\x12\x05\x62igfs\"0\n\x08NodeInfo\x12\x0f\n\x07\x61\x64\x64ress\x18\x01 \x01(\t\x12\x13\n\x0b\x63hunk_count\x18\x02 \x01(\x05\"I\n\x12\x43hunkUploadRequest\x12%\n\x08metadata\x18\x01 \x01(\x0b\x32\x13.bigfs.FileMetadata\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\"`\n\x15\x43hunkDownloadResponse\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\x12\x16\n\x0eis_final_chunk\x18\x02 \x01(\x08\x12\x0e\n\x06offset\x18\x03 \x01(\x03\x12\x11\n\tfile_size\x18\x04 \x01(\x03\"K\n\x0c\x46ileMetadata\x12\x13\n\x0bremote_path\x18\x01 \x01(\t\x12\x17\n\ntotal_size\x18\x02 \x01(\x03H\x00\x88\x01\x01\x42\r\n\x0b_total_size\"\x1b\n\x0bPathRequest\x12\x0c\n\x04path\x18\x01 \x01(\t\"-\n\x0b\x46ileRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x0c\n\x04size\x18\x02 \x01(\x03\"o\n\x10\x46ileListResponse\x12/\n\x05\x66iles\x18\x01 \x03(\x0b\x32 .bigfs.FileListResponse.FileInfo\x1a*\n\x08\x46ileInfo\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x0c\n\x04size\x18\x02 \x01(\x03\"d\n\x14\x46ileLocationResponse\x12\x12\n\nis_sharded\x18\x01 \x01(\x08\x12\'\n\tlocations\x18\x02 \x03(\x0b\x32\x14.bigfs.ChunkLocation\x12\x0f\n\x07plan_id\x18\x03 \x01(\t\"5\n\x10WritePlanRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x0f\n\x07plan_id\x18\x02 \x01(\t\"\x87\x01\n\rChunkLocation\x12\x13\n\x0b\x63hunk_index\x18\x01 \x01(\x05\x12\x10\n\x08\x63hunk_id\x18\x02 \x01(\t\x12\x17\n\x0fprimary_node_id\x18\x03 \x01(\t\x12\x18\n\x10replica_node_ids\x18\x04 \x03(\t\x12\x0e\n\x06offset\x18\x05 \x01(\x03\x12\x0c\n\x04size\x18\x06 \x01(\x03\" \n\x0c\x43hunkRequest\x12\x10\n\x08\x63hunk_id\x18\x01 \x01(\t\"O\n\x05\x43hunk\x12\x10\n\x08\x63hunk_id\x18\x01 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x02 \x01(\x0c\x12\x18\n\x10replica_node_ids\x18\x03 \x03(\t\x12\x0c\n\x04size\x18\x04 \x01(\x03\"2\n\x0eSimpleResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"e\n\x12RemoveFileResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x16\n\x0eremoved_chunks\x18\x03 \x03(\t\x12\x15\n\rfailed_chunks\x18\x04 \x03(\t2\x89\x02\n\x0eGatewayService\x12@\n\nUploadFile\x12\x19.bigfs.ChunkUploadRequest\x1a\x15.bigfs.SimpleResponse(\x01\x12\x42\n\x0c\x44ownloadFile\x12\x12.bigfs.FileRequest\x1a\x1c.bigfs.ChunkDownloadResponse0\x01\x12\x38\n\tListFiles\x12\x12.bigfs.PathRequest\x1a\x17.bigfs.FileListResponse\x12\x37\n\nRemoveFile\x12\x12.bigfs.FileRequest\x1a\x15.bigfs.SimpleResponse2\xd4\x03\n\x0fMetadataService\x12\x38\n\x0cRegisterNode\x12\x0f.bigfs.NodeInfo\x1a\x15.bigfs.SimpleResponse\"\x00\x12\x44\n\x0fGetFileLocation\x12\x12.bigfs.FileRequest\x1a\x1b.bigfs.FileLocationResponse\"\x00\x12\x41\n\x0cGetWritePlan\x12\x12.bigfs.FileRequest\x1a\x1b.bigfs.FileLocationResponse\"\x00\x12?\n\x0b\x43ommitWrite\x12\x17.bigfs.WritePlanRequest\x1a\x15.bigfs.SimpleResponse\"\x00\x12\x42\n\nAbortWrite\x12\x17.bigfs.WritePlanRequest\x1a\x19.bigfs.RemoveFileResponse\"\x00\x12:\n\tListFiles\x12\x12.bigfs.PathRequest\x1a\x17.bigfs.FileListResponse\"\x00\x12=\n\nRemoveFile\x12\x12.bigfs.FileRequest\x1a\x19.bigfs.RemoveFileResponse\"\x00\x32\xba\x01\n\x0eStorageService\x12\x35\n\nStoreChunk\x12\x0c.bigfs.Chunk\x1a\x15.bigfs.SimpleResponse\"\x00(\x01\x12\x34\n\rRetrieveChunk\x12\x13.bigfs.ChunkRequest\x1a\x0c.bigfs.Chunk\"\x00\x12;\n\x0bRemoveChunk\x12\x13.bigfs.ChunkRequest\x1a\x15.bigfs.SimpleResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -34,35 +34,37 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_NODEINFO']._serialized_start=22
   _globals['_NODEINFO']._serialized_end=70
   _globals['_CHUNKUPLOADREQUEST']._serialized_start=72
-  _globals['_CHUNKUPLOADREQUEST']._serialized_end=160
-  _globals['_CHUNKDOWNLOADRESPONSE']._serialized_start=162
-  _globals['_CHUNKDOWNLOADRESPONSE']._serialized_end=223
-  _globals['_FILEMETADATA']._serialized_start=225
-  _globals['_FILEMETADATA']._serialized_end=260
-  _globals['_PATHREQUEST']._serialized_start=262
-  _globals['_PATHREQUEST']._serialized_end=289
-  _globals['_FILEREQUEST']._serialized_start=291
-  _globals['_FILEREQUEST']._serialized_end=336
-  _globals['_FILELISTRESPONSE']._serialized_start=338
-  _globals['_FILELISTRESPONSE']._serialized_end=449
-  _globals['_FILELISTRESPONSE_FILEINFO']._serialized_start=407
-  _globals['_FILELISTRESPONSE_FILEINFO']._serialized_end=449
-  _globals['_FILELOCATIONRESPONSE']._serialized_start=451
-  _globals['_FILELOCATIONRESPONSE']._serialized_end=534
-  _globals['_CHUNKLOCATION']._serialized_start=536
-  _globals['_CHUNKLOCATION']._serialized_end=641
-  _globals['_CHUNKREQUEST']._serialized_start=643
-  _globals['_CHUNKREQUEST']._serialized_end=675
-  _globals['_CHUNK']._serialized_start=677
-  _globals['_CHUNK']._serialized_end=742
-  _globals['_SIMPLERESPONSE']._serialized_start=744
-  _globals['_SIMPLERESPONSE']._serialized_end=794
-  _globals['_REMOVEFILERESPONSE']._serialized_start=796
-  _globals['_REMOVEFILERESPONSE']._serialized_end=897
-  _globals['_GATEWAYSERVICE']._serialized_start=900
-  _globals['_GATEWAYSERVICE']._serialized_end=1165
-  _globals['_METADATASERVICE']._serialized_start=1168
-  _globals['_METADATASERVICE']._serialized_end=1503
-  _globals['_STORAGESERVICE']._serialized_start=1506
-  _globals['_STORAGESERVICE']._serialized_end=1690
+  _globals['_CHUNKUPLOADREQUEST']._serialized_end=145
+  _globals['_CHUNKDOWNLOADRESPONSE']._serialized_start=147
+  _globals['_CHUNKDOWNLOADRESPONSE']._serialized_end=243
+  _globals['_FILEMETADATA']._serialized_start=245
+  _globals['_FILEMETADATA']._serialized_end=320
+  _globals['_PATHREQUEST']._serialized_start=322
+  _globals['_PATHREQUEST']._serialized_end=349
+  _globals['_FILEREQUEST']._serialized_start=351
+  _globals['_FILEREQUEST']._serialized_end=396
+  _globals['_FILELISTRESPONSE']._serialized_start=398
+  _globals['_FILELISTRESPONSE']._serialized_end=509
+  _globals['_FILELISTRESPONSE_FILEINFO']._serialized_start=467
+  _globals['_FILELISTRESPONSE_FILEINFO']._serialized_end=509
+  _globals['_FILELOCATIONRESPONSE']._serialized_start=511
+  _globals['_FILELOCATIONRESPONSE']._serialized_end=611
+  _globals['_WRITEPLANREQUEST']._serialized_start=613
+  _globals['_WRITEPLANREQUEST']._serialized_end=666
+  _globals['_CHUNKLOCATION']._serialized_start=669
+  _globals['_CHUNKLOCATION']._serialized_end=804
+  _globals['_CHUNKREQUEST']._serialized_start=806
+  _globals['_CHUNKREQUEST']._serialized_end=838
+  _globals['_CHUNK']._serialized_start=840
+  _globals['_CHUNK']._serialized_end=919
+  _globals['_SIMPLERESPONSE']._serialized_start=921
+  _globals['_SIMPLERESPONSE']._serialized_end=971
+  _globals['_REMOVEFILERESPONSE']._serialized_start=973
+  _globals['_REMOVEFILERESPONSE']._serialized_end=1074
+  _globals['_GATEWAYSERVICE']._serialized_start=1077
+  _globals['_GATEWAYSERVICE']._serialized_end=1342
+  _globals['_METADATASERVICE']._serialized_start=1345
+  _globals['_METADATASERVICE']._serialized_end=1813
+  _globals['_STORAGESERVICE']._serialized_start=1816
+  _globals['_STORAGESERVICE']._serialized_end=2002
 # @@protoc_insertion_point(module_scope)
@@ -68,7 +68,7 @@ class GatewayServiceServicer(object):
         raise NotImplementedError('Method not implemented!')
 
     def DownloadFile(self, request, context):
-        """NOVO: Download via streaming (em vez de GetDownloadMap)
+        """Download via streaming: o Gateway busca os chunks e os repassa em ordem
         """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
@@ -256,6 +256,16 @@ class MetadataServiceStub(object):
                 request_serializer=bigfs__pb2.FileRequest.SerializeToString,
                 response_deserializer=bigfs__pb2.FileLocationResponse.FromString,
                 _registered_method=True)
+        self.CommitWrite = channel.unary_unary(
+                '/bigfs.MetadataService/CommitWrite',
+                request_serializer=bigfs__pb2.WritePlanRequest.SerializeToString,
+                response_deserializer=bigfs__pb2.SimpleResponse.FromString,
+                _registered_method=True)
+        self.AbortWrite = channel.unary_unary(
+                '/bigfs.MetadataService/AbortWrite',
+                request_serializer=bigfs__pb2.WritePlanRequest.SerializeToString,
+                response_deserializer=bigfs__pb2.RemoveFileResponse.FromString,
+                _registered_method=True)
         self.ListFiles = channel.unary_unary(
                 '/bigfs.MetadataService/ListFiles',
                 request_serializer=bigfs__pb2.PathRequest.SerializeToString,
@@ -285,7 +295,22 @@ class MetadataServiceServicer(object):
         raise NotImplementedError('Method not implemented!')
 
     def GetWritePlan(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+        """O plano fica pendente (invisível para ListFiles/GetFileLocation) até o CommitWrite
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CommitWrite(self, request, context):
+        """Publica o plano depois que todos os chunks foram armazenados
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AbortWrite(self, request, context):
+        """Descarta o plano de um upload que falhou e remove os chunks já gravados
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
@@ -321,6 +346,16 @@ def add_MetadataServiceServicer_to_server(servicer, server):
                     request_deserializer=bigfs__pb2.FileRequest.FromString,
                     response_serializer=bigfs__pb2.FileLocationResponse.SerializeToString,
             ),
+            'CommitWrite': grpc.unary_unary_rpc_method_handler(
+                    servicer.CommitWrite,
+                    request_deserializer=bigfs__pb2.WritePlanRequest.FromString,
+                    response_serializer=bigfs__pb2.SimpleResponse.SerializeToString,
+            ),
+            'AbortWrite': grpc.unary_unary_rpc_method_handler(
+                    servicer.AbortWrite,
+                    request_deserializer=bigfs__pb2.WritePlanRequest.FromString,
+                    response_serializer=bigfs__pb2.RemoveFileResponse.SerializeToString,
+            ),
             'ListFiles': grpc.unary_unary_rpc_method_handler(
                     servicer.ListFiles,
                     request_deserializer=bigfs__pb2.PathRequest.FromString,
@@ -424,6 +459,60 @@ class MetadataService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def CommitWrite(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bigfs.MetadataService/CommitWrite',
+            bigfs__pb2.WritePlanRequest.SerializeToString,
+            bigfs__pb2.SimpleResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AbortWrite(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/bigfs.MetadataService/AbortWrite',
+            bigfs__pb2.WritePlanRequest.SerializeToString,
+            bigfs__pb2.RemoveFileResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ListFiles(request,
             target,
@@ -488,7 +577,7 @@ class StorageServiceStub(object):
         Args:
             channel: A grpc.Channel.
         """
-        self.StoreChunk = channel.unary_unary(
+        self.StoreChunk = channel.stream_unary(
                 '/bigfs.StorageService/StoreChunk',
                 request_serializer=bigfs__pb2.Chunk.SerializeToString,
                 response_deserializer=bigfs__pb2.SimpleResponse.FromString,
@@ -508,8 +597,9 @@ class StorageServiceStub(object):
 class StorageServiceServicer(object):
     """Missing associated documentation comment in .proto file."""
 
-    def StoreChunk(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+    def StoreChunk(self, request_iterator, context):
+        """O chunk chega em pedaços; só o primeiro leva chunk_id, replica_node_ids e size
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
@@ -530,7 +620,7 @@ class StorageServiceServicer(object):
 
 def add_StorageServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
-            'StoreChunk': grpc.unary_unary_rpc_method_handler(
+            'StoreChunk': grpc.stream_unary_rpc_method_handler(
                     servicer.StoreChunk,
                     request_deserializer=bigfs__pb2.Chunk.FromString,
                     response_serializer=bigfs__pb2.SimpleResponse.SerializeToString,
@@ -557,7 +647,7 @@ class StorageService(object):
     """Missing associated documentation comment in .proto file."""
 
     @staticmethod
-    def StoreChunk(request,
+    def StoreChunk(request_iterator,
             target,
             options=(),
             channel_credentials=None,
@@ -567,8 +657,8 @@ class StorageService(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
+        return grpc.experimental.stream_unary(
+            request_iterator,
             target,
             '/bigfs.StorageService/StoreChunk',
             bigfs__pb2.Chunk.SerializeToString,
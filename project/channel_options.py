@@ -0,0 +1,22 @@
+# Constantes de transporte compartilhadas por cliente, Gateway, Metadata Server, Storage
+# Nodes e teste de desempenho.
+
+# Tamanho dos chunks: o Gateway particiona os arquivos e o Metadata Server planeja a escrita
+# com o mesmo valor. 1 KiB abaixo de 1 MiB: a mensagem serializada (payload + framing) cabe
+# no tier de 1 MiB
+CHUNK_SIZE_BYTES = (1 << 20) - 1024
+
+# Opções de canal/servidor gRPC. Chunks de 1 MiB: limites de mensagem folgados e janela HTTP/2
+# grande o bastante para um chunk inteiro, evitando pausas de WINDOW_UPDATE a cada mensagem.
+# lookahead_bytes é a janela inicial por stream no C-core (initial_stream_window_size e
+# initial_connection_window_size são argumentos do grpc-go, ignorados aqui).
+GRPC_OPTIONS = [
+    ('grpc.max_send_message_length', 8 << 20),
+    ('grpc.max_receive_message_length', 8 << 20),
+    ('grpc.http2.bdp_probe', 1),
+    ('grpc.http2.lookahead_bytes', 8 << 20),
+    # Frames de até 4 MiB: um chunk de 1 MiB (ou um pedaço do StoreChunk) sai em um frame
+    ('grpc.http2.max_frame_size', 4 << 20),
+    # Bytes enfileirados por stream antes de o transporte escrever no socket
+    ('grpc.http2.write_buffer_size', 1 << 20),
+]
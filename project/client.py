@@ -2,28 +2,73 @@ import grpc
 import os
 import sys
 import cmd
+import operator
 import shlex
+# Serialização dos chunks no backend upb (C) do protobuf; precisa ser definido antes
+# de importar os módulos gerados
+os.environ.setdefault('PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION', 'upb')
 import bigfs_pb2
 import bigfs_pb2_grpc
+from channel_options import CHUNK_SIZE_BYTES, GRPC_OPTIONS
 
-CHUNK_SIZE_BYTES = 1 * 1024 * 1024
+WRITE_BATCH_CHUNKS = 16
+
+def _fmt_size(size):
+    size_mb = size / (1024*1024)
+    return f"{size_mb:.2f} MB" if size_mb >= 1 else f"{size / 1024:.2f} KB"
+
+def _write_all(fd, buffers, offset):
+    """Grava os buffers em sequência no fd a partir de offset, com pwritev quando disponível."""
+    views = [memoryview(buf) for buf in buffers if buf]
+    if not hasattr(os, 'pwritev'):
+        os.lseek(fd, offset, os.SEEK_SET)
+    while views:
+        if hasattr(os, 'pwritev'):
+            written = os.pwritev(fd, views, offset)
+        elif hasattr(os, 'writev'):
+            written = os.writev(fd, views)
+        else:
+            written = os.write(fd, views[0])
+        offset += written
+        # Escrita parcial: descarta o que já foi gravado e repete com o restante
+        while views and written >= len(views[0]):
+            written -= len(views[0])
+            views.pop(0)
+        if written:
+            views[0] = views[0][written:]
 
 class BigFSClient:
     def __init__(self, gateway_address):
         try:
-            self.gateway_channel = grpc.insecure_channel(gateway_address)
+            self.gateway_channel = grpc.insecure_channel(
+                gateway_address,
+                options=GRPC_OPTIONS,
+                compression=grpc.Compression.NoCompression
+            )
             grpc.channel_ready_future(self.gateway_channel).result(timeout=5)
             self.gateway_stub = bigfs_pb2_grpc.GatewayServiceStub(self.gateway_channel)
         except grpc.FutureTimeoutError:
             print(f"Erro fatal: Não foi possível conectar ao Gateway em {gateway_address}.")
             sys.exit(1)
 
+    @staticmethod
+    def _bfs_path(remote):
+        return remote.removeprefix('bfs://').strip('/')
+
     def _upload_generator(self, local_path, remote_path):
         try:
-            yield bigfs_pb2.ChunkUploadRequest(
-                metadata=bigfs_pb2.FileMetadata(remote_path=remote_path)
-            )
-            with open(local_path, 'rb') as f:
+            # Sem buffer do Python: cada read() vai direto do kernel para o bytes final
+            # do protobuf (que exige bytes imutáveis, então um bytearray reciclado só
+            # acrescentaria uma cópia)
+            with open(local_path, 'rb', buffering=0) as f:
+                # O primeiro bloco segue junto com os metadados
+                yield bigfs_pb2.ChunkUploadRequest(
+                    metadata=bigfs_pb2.FileMetadata(
+                        remote_path=remote_path,
+                        total_size=os.fstat(f.fileno()).st_size
+                    ),
+                    data=f.read(CHUNK_SIZE_BYTES)
+                )
                 while True:
                     data = f.read(CHUNK_SIZE_BYTES)
                     if not data: 
@@ -33,7 +78,7 @@ class BigFSClient:
             return
 
     def copy_to_bigfs(self, local, remote):
-        remote_name = remote.split("://")[-1].strip('/')
+        remote_name = self._bfs_path(remote)
         if not os.path.exists(local):
             print(f"Erro: Arquivo local '{local}' não encontrado.")
             return
@@ -49,33 +94,67 @@ class BigFSClient:
             print(f"❌ Erro no upload: {e.details()}")
 
     def get_from_bigfs(self, remote, local):
-        remote_name = remote.split("://")[-1].strip('/')
+        remote_name = self._bfs_path(remote)
         print(f"--- Baixando de [BigFS] bfs://{remote_name} -> [Local] {local} ---")
         
+        fd = None
         try:
             # Simples: apenas solicita download ao Gateway
             file_req = bigfs_pb2.FileRequest(filename=remote_name)
             response_stream = self.gateway_stub.DownloadFile(file_req)
             
-            # Recebe chunks via streaming e salva
-            with open(local, 'wb') as f:
+            # Recebe chunks via streaming e grava cada um na sua posição do arquivo,
+            # agrupando chunks contíguos em lotes (um pwritev por lote)
+            fd = os.open(local, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+            try:
+                batch = []
+                batch_offset = batch_end = 0
                 chunk_count = 0
                 for chunk_response in response_stream:
-                    f.write(chunk_response.data)
+                    if chunk_count == 0:
+                        self._preallocate(fd, chunk_response.file_size)
+                    
+                    if batch and (chunk_response.offset != batch_end or len(batch) >= WRITE_BATCH_CHUNKS):
+                        _write_all(fd, batch, batch_offset)
+                        batch = []
+                    if not batch:
+                        batch_offset = batch_end = chunk_response.offset
+                    batch.append(chunk_response.data)
+                    batch_end += len(chunk_response.data)
                     chunk_count += 1
-                    print(f"Cliente: Chunk {chunk_count} recebido e salvo")
+                    print(f"Cliente: Chunk {chunk_count} recebido")
                     
                     if chunk_response.is_final_chunk:
                         print(f"Cliente: ✅ Último chunk recebido")
                         break
+                _write_all(fd, batch, batch_offset)
+            finally:
+                os.close(fd)
             
             print(f"✅ Arquivo '{remote_name}' salvo como '{local}'.")
             
         except grpc.RpcError as e:
             print(f"❌ Erro ao baixar: {e.details()}")
+            # O arquivo foi pré-alocado com o tamanho final: um download interrompido
+            # deixaria um arquivo do tamanho certo com o restante zerado
+            if fd is not None:
+                try:
+                    os.unlink(local)
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _preallocate(fd, file_size):
+        # Reserva os extents do arquivo de uma vez; é só uma otimização, então falhas
+        # (ou plataformas sem posix_fallocate) são ignoradas
+        if file_size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, file_size)
+            except OSError:
+                pass
 
     def list_files(self, remote):
-        path = remote.split("://")[-1].strip('/')
+        path = self._bfs_path(remote)
         print(f"--- Listando [BigFS] bfs://{path or '/'} ---")
         
         try:
@@ -84,19 +163,19 @@ class BigFSClient:
                 print("Nenhum arquivo encontrado.")
                 return
                 
-            print(f"{'Nome':<40} {'Tamanho (aprox)'}") 
-            print(f"{'----':<40} {'---------------'}")
-            
-            for info in sorted(resp.files, key=lambda f: f.filename):
-                size_mb = info.size / (1024*1024)
-                size_str = f"{size_mb:.2f} MB" if size_mb >= 1 else f"{info.size / 1024:.2f} KB"
-                print(f"{info.filename:<40} {size_str}")
+            # Monta a listagem inteira e escreve de uma vez (um único acesso ao stdout)
+            lines = [f"{'Nome':<40} {'Tamanho'}", f"{'----':<40} {'-------'}"]
+            lines.extend(
+                f"{info.filename:<40} {_fmt_size(info.size)}"
+                for info in sorted(resp.files, key=operator.attrgetter('filename'))
+            )
+            sys.stdout.write('\n'.join(lines) + '\n')
                 
         except grpc.RpcError as e: 
             print(f"❌ Erro ao listar: {e.details()}")
 
     def remove_from_bigfs(self, remote):
-        remote_name = remote.split("://")[-1].strip('/')
+        remote_name = self._bfs_path(remote)
         print(f"--- Removendo [BigFS] bfs://{remote_name} ---")
         
         try:
@@ -1,51 +1,159 @@
 import grpc
 from concurrent import futures
+import atexit
+import collections
+import itertools
 import os
 import sys
+import threading
+import time
 import uuid
+# Serialização dos chunks no backend upb (C) do protobuf; precisa ser definido antes
+# de importar os módulos gerados
+os.environ.setdefault('PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION', 'upb')
 import bigfs_pb2
 import bigfs_pb2_grpc
+from channel_options import CHUNK_SIZE_BYTES, GRPC_OPTIONS
 
-CHUNK_SIZE_BYTES = 1 * 1024 * 1024
+# Pedaços de 128 KiB no stream StoreChunk: nenhuma mensagem carrega o chunk inteiro
+STORE_PIECE_BYTES = 128 * 1024
+UPLOAD_MAX_IN_FLIGHT = 8
+# Espera máxima por uma StoreChunk em andamento quando o upload falha, antes do AbortWrite
+STORE_SETTLE_TIMEOUT_SECONDS = 5
+# Teto de bytes buscados à frente do stream por download: limita a memória por download
+# a O(janela) em vez de O(arquivo) quando o cliente consome mais devagar que os nós entregam
+DOWNLOAD_MAX_BUFFERED_BYTES = 16 << 20
+SERVER_WORKERS = max(32, (os.cpu_count() or 8) * 4)
 METADATA_SERVER_ADDRESS = '127.0.0.1:50051'
+# Keepalive no canal do Metadata Server: evita que o canal ocioso seja derrubado e
+# que o próximo GetWritePlan/GetFileLocation pague a reconexão
+METADATA_CHANNEL_OPTIONS = GRPC_OPTIONS + [
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+METADATA_RETRIES = 2
+METADATA_RETRY_BACKOFF_SECONDS = 0.2
+STORAGE_CHANNEL_OPTIONS = GRPC_OPTIONS + [
+    ('grpc.keepalive_time_ms', 30000),
+]
+
+def _env_download_workers():
+    """Lê BIGFS_DL_WORKERS uma vez; valores inválidos são ignorados com um aviso."""
+    value = os.environ.get('BIGFS_DL_WORKERS')
+    if value is None:
+        return None
+    try:
+        return max(1, int(value))
+    except ValueError:
+        print(f"Gateway: ⚠️  BIGFS_DL_WORKERS inválido ({value!r}), usando o padrão")
+        return None
+
+DOWNLOAD_WORKERS_OVERRIDE = _env_download_workers()
+
+def _download_workers(total_chunks):
+    """Buscas de chunk simultâneas por download (sobrescrevível via BIGFS_DL_WORKERS)."""
+    workers = DOWNLOAD_WORKERS_OVERRIDE or (os.cpu_count() or 4) * 4
+    # A sobrescrita também respeita o teto de DOWNLOAD_MAX_BUFFERED_BYTES
+    return max(1, min(workers, total_chunks, DOWNLOAD_MAX_BUFFERED_BYTES // CHUNK_SIZE_BYTES))
+
+def _iter_file_chunks(request_iterator):
+    """Reagrupa o stream do cliente em blocos de CHUNK_SIZE_BYTES (o último pode ser menor)."""
+    pieces = []
+    buffered = 0
+    for request in request_iterator:
+        if not request.data:
+            continue
+        pieces.append(request.data)
+        buffered += len(request.data)
+        while buffered >= CHUNK_SIZE_BYTES:
+            joined = pieces[0] if len(pieces) == 1 else b''.join(pieces)
+            yield joined[:CHUNK_SIZE_BYTES]
+            rest = joined[CHUNK_SIZE_BYTES:]
+            pieces = [rest] if rest else []
+            buffered = len(rest)
+    if pieces:
+        yield b''.join(pieces)
+
+def _chunk_pieces(loc, chunk_data, aborted):
+    # O primeiro pedaço identifica o chunk, as réplicas e o tamanho; os seguintes levam só dados.
+    # Se o upload falhar no meio, o stream termina antes do tamanho anunciado e o nó descarta o chunk.
+    yield bigfs_pb2.Chunk(
+        chunk_id=loc.chunk_id,
+        data=chunk_data[:STORE_PIECE_BYTES],
+        replica_node_ids=loc.replica_node_ids,
+        size=len(chunk_data)
+    )
+    for start in range(STORE_PIECE_BYTES, len(chunk_data), STORE_PIECE_BYTES):
+        if aborted.is_set():
+            return
+        yield bigfs_pb2.Chunk(data=chunk_data[start:start + STORE_PIECE_BYTES])
 
 class GatewayService(bigfs_pb2_grpc.GatewayServiceServicer):
     def __init__(self):
-        self.metadata_channel = grpc.insecure_channel(METADATA_SERVER_ADDRESS)
+        self.metadata_channel = grpc.insecure_channel(
+            METADATA_SERVER_ADDRESS,
+            options=METADATA_CHANNEL_OPTIONS,
+            compression=grpc.Compression.NoCompression
+        )
         self.metadata_stub = bigfs_pb2_grpc.MetadataServiceStub(self.metadata_channel)
         self.temp_dir = "gateway_temp"
         if not os.path.exists(self.temp_dir): 
             os.makedirs(self.temp_dir)
+        # Canais persistentes para os storage nodes, reutilizados entre chunks e arquivos
+        self._storage_channels = {}
+        self._stub_cache = {}
+        self._stub_lock = threading.Lock()
+        atexit.register(self._close_storage_channels)
+
+    def _get_storage_stub(self, node_addr):
+        stub = self._stub_cache.get(node_addr)
+        if stub is None:
+            with self._stub_lock:
+                stub = self._stub_cache.get(node_addr)
+                if stub is None:
+                    channel = grpc.insecure_channel(
+                        node_addr,
+                        options=STORAGE_CHANNEL_OPTIONS,
+                        compression=grpc.Compression.NoCompression
+                    )
+                    stub = bigfs_pb2_grpc.StorageServiceStub(channel)
+                    self._storage_channels[node_addr] = channel
+                    self._stub_cache[node_addr] = stub
+        return stub
+
+    def _call_metadata(self, method, request):
+        # Uma queda momentânea do canal (UNAVAILABLE) não deve derrubar o upload/download inteiro.
+        # Erros de aplicação do Metadata Server (ex.: nós insuficientes) usam FAILED_PRECONDITION
+        # e não são repetidos.
+        for attempt in range(METADATA_RETRIES + 1):
+            try:
+                return method(request)
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.UNAVAILABLE or attempt == METADATA_RETRIES:
+                    raise
+                print(f"Gateway: ⚠️  Metadata Server indisponível, nova tentativa ({attempt + 1}/{METADATA_RETRIES})")
+                time.sleep(METADATA_RETRY_BACKOFF_SECONDS * (attempt + 1))
+
+    def _close_storage_channels(self):
+        with self._stub_lock:
+            for channel in self._storage_channels.values():
+                channel.close()
+            self._storage_channels.clear()
+            self._stub_cache.clear()
 
     def UploadFile(self, request_iterator, context):
-        temp_filename = os.path.join(self.temp_dir, str(uuid.uuid4()))
         try:
             first_chunk = next(request_iterator)
-            remote_path = first_chunk.metadata.remote_path
-            file_size = 0
+            metadata = first_chunk.metadata
             
-            with open(temp_filename, 'wb') as f:
-                for chunk in request_iterator:
-                    f.write(chunk.data)
-                    file_size += len(chunk.data)
-            
-            file_req = bigfs_pb2.FileRequest(filename=remote_path, size=file_size)
-            write_plan = self.metadata_stub.GetWritePlan(file_req)
-            
-            if not write_plan.locations:
-                raise Exception(context.details() or "Falha ao obter plano de escrita.")
-            
-            with open(temp_filename, 'rb') as f:
-                for loc in write_plan.locations:
-                    chunk_data = f.read(CHUNK_SIZE_BYTES)
-                    with grpc.insecure_channel(loc.primary_node_id) as channel:
-                        stub = bigfs_pb2_grpc.StorageServiceStub(channel)
-                        chunk_msg = bigfs_pb2.Chunk(
-                            chunk_id=loc.chunk_id, 
-                            data=chunk_data, 
-                            replica_node_ids=loc.replica_node_ids
-                        )
-                        stub.StoreChunk(chunk_msg)
+            # Os dados do primeiro bloco (se houver) vêm junto com os metadados
+            data_iterator = itertools.chain((first_chunk,), request_iterator)
+            if metadata.HasField('total_size'):
+                self._upload_streaming(metadata.remote_path, metadata.total_size, data_iterator)
+            else:
+                self._upload_staged(metadata.remote_path, data_iterator)
             
             return bigfs_pb2.SimpleResponse(success=True)
             
@@ -53,40 +161,179 @@ class GatewayService(bigfs_pb2_grpc.GatewayServiceServicer):
             context.set_details(str(e))
             context.set_code(grpc.StatusCode.INTERNAL)
             return bigfs_pb2.SimpleResponse(success=False, message=str(e))
+
+    def _upload_streaming(self, remote_path, file_size, request_iterator):
+        """
+        Encaminha cada chunk aos storage nodes assim que ele é recebido, mantendo
+        em memória apenas os chunks ainda em trânsito
+        """
+        write_plan = self._get_write_plan(remote_path, file_size)
+        locations = write_plan.locations
+        pending = collections.deque()
+        aborted = threading.Event()
+        next_index = 0
+        received = 0
+        
+        try:
+            try:
+                for chunk_data in _iter_file_chunks(request_iterator):
+                    if next_index >= len(locations):
+                        raise Exception("Arquivo maior que o tamanho informado no upload.")
+                    received += len(chunk_data)
+                    self._submit_store(pending, locations[next_index], chunk_data, aborted)
+                    next_index += 1
+                
+                if received != file_size:
+                    raise Exception(f"Tamanho recebido ({received}) difere do informado ({file_size}).")
+                
+                # Arquivo vazio: o plano ainda reserva um chunk
+                for loc in locations[next_index:]:
+                    self._submit_store(pending, loc, b'', aborted)
+                
+                self._wait_stores(pending)
+            finally:
+                self._settle_stores(pending, aborted)
+            self._commit_write(remote_path, write_plan)
+        except BaseException:
+            self._abort_write(remote_path, write_plan)
+            raise
+
+    def _upload_staged(self, remote_path, request_iterator):
+        """
+        Fallback para clientes que não informam o tamanho: grava o arquivo em disco
+        para descobrir o tamanho antes de pedir o plano de escrita
+        """
+        temp_filename = os.path.join(self.temp_dir, str(uuid.uuid4()))
+        try:
+            file_size = 0
+            
+            with open(temp_filename, 'wb') as f:
+                for chunk in request_iterator:
+                    f.write(chunk.data)
+                    file_size += len(chunk.data)
+            
+            write_plan = self._get_write_plan(remote_path, file_size)
+            
+            # A releitura do disco se sobrepõe aos StoreChunk já em andamento
+            pending = collections.deque()
+            aborted = threading.Event()
+            try:
+                try:
+                    with open(temp_filename, 'rb') as f:
+                        for loc in write_plan.locations:
+                            self._submit_store(pending, loc, f.read(CHUNK_SIZE_BYTES), aborted)
+                    self._wait_stores(pending)
+                finally:
+                    self._settle_stores(pending, aborted)
+                self._commit_write(remote_path, write_plan)
+            except BaseException:
+                self._abort_write(remote_path, write_plan)
+                raise
         finally:
             if os.path.exists(temp_filename): 
                 os.remove(temp_filename)
 
+    def _get_write_plan(self, remote_path, file_size):
+        file_req = bigfs_pb2.FileRequest(filename=remote_path, size=file_size)
+        write_plan = self._call_metadata(self.metadata_stub.GetWritePlan, file_req)
+        
+        if not write_plan.locations:
+            raise Exception("Falha ao obter plano de escrita.")
+        return write_plan
+
+    def _commit_write(self, remote_path, write_plan):
+        # Só aqui o arquivo passa a aparecer no ListFiles/GetFileLocation
+        commit_req = bigfs_pb2.WritePlanRequest(filename=remote_path, plan_id=write_plan.plan_id)
+        if not self._call_metadata(self.metadata_stub.CommitWrite, commit_req).success:
+            raise Exception("Falha ao publicar plano de escrita.")
+
+    def _abort_write(self, remote_path, write_plan):
+        # Chamado depois de _settle_stores: descarta o plano pendente e remove os chunks que
+        # os primários publicaram. A versão anterior do arquivo é mantida. As réplicas gravam
+        # depois do primário, então uma réplica lenta ainda pode publicar após o RemoveChunk
+        # e deixar um chunk órfão.
+        abort_req = bigfs_pb2.WritePlanRequest(filename=remote_path, plan_id=write_plan.plan_id)
+        try:
+            self.metadata_stub.AbortWrite(abort_req)
+        except grpc.RpcError as e:
+            print(f"Gateway: ⚠️  Falha ao descartar plano de '{remote_path}': {e.details()}")
+
+    def _submit_store(self, pending, loc, chunk_data, aborted):
+        # Limita os chunks em trânsito para não acumular o arquivo inteiro em memória. Cada
+        # StoreChunk.future com iterador ocupa uma thread do gRPC enquanto envia os pedaços,
+        # então o limite também vale para threads: UPLOAD_MAX_IN_FLIGHT por upload
+        if len(pending) >= UPLOAD_MAX_IN_FLIGHT:
+            self._check_store(*pending.popleft())
+        stub = self._get_storage_stub(loc.primary_node_id)
+        pending.append((loc, stub.StoreChunk.future(_chunk_pieces(loc, chunk_data, aborted))))
+
+    def _settle_stores(self, pending, aborted):
+        # Upload falhou: os streams ainda incompletos param no próximo pedaço (e o nó os
+        # descarta); os que já foram enviados por inteiro terminam antes do AbortWrite, para
+        # que o RemoveChunk não chegue antes da publicação do chunk
+        aborted.set()
+        for _, future in pending:
+            try:
+                future.result(timeout=STORE_SETTLE_TIMEOUT_SECONDS)
+            except grpc.FutureTimeoutError:
+                future.cancel()
+            except grpc.RpcError:
+                pass
+        pending.clear()
+
+    def _wait_stores(self, pending):
+        while pending:
+            self._check_store(*pending.popleft())
+
+    def _check_store(self, loc, future):
+        response = future.result()
+        if not response.success:
+            raise Exception(f"Falha ao armazenar chunk {loc.chunk_id} em {loc.primary_node_id}")
+
     def DownloadFile(self, request, context):
+        pending = {}
         try:
             print(f"--- Gateway coordenando download de '{request.filename}' ---")
             
             # 1. Obter localização dos chunks do Metadata Server
             file_req = bigfs_pb2.FileRequest(filename=request.filename)
-            locations_response = self.metadata_stub.GetFileLocation(file_req)
+            locations_response = self._call_metadata(self.metadata_stub.GetFileLocation, file_req)
             
             if not locations_response.locations:
                 context.set_code(grpc.StatusCode.NOT_FOUND)
                 context.set_details("Arquivo não encontrado")
                 return
             
-            # 2. Para cada chunk, buscar dados e fazer streaming
-            total_chunks = len(locations_response.locations)
+            # 2. Buscar os chunks em paralelo (com fallback automático), mantendo no
+            # máximo `workers` buscas em andamento à frente do stream
+            locations = locations_response.locations
+            total_chunks = len(locations)
+            file_size = sum(loc.size for loc in locations)
+            workers = _download_workers(total_chunks)
+            next_to_fetch = 0
             
-            for i, location in enumerate(locations_response.locations):
-                # Buscar chunk com fallback automático
-                chunk_data = self._fetch_chunk_with_fallback(location)
+            # 3. Enviar os chunks via streaming, na ordem original. Cada future sai do
+            # dicionário ao ser consumida para que o payload já enviado seja liberado.
+            # O yield só retorna depois que a mensagem entra na janela HTTP/2 do cliente,
+            # então um cliente lento também segura as novas buscas (back-pressure).
+            for i in range(total_chunks):
+                while next_to_fetch < min(total_chunks, i + workers):
+                    pending[next_to_fetch] = self._fetch_chunk_with_fallback(locations[next_to_fetch])
+                    next_to_fetch += 1
+                
+                chunk_data = pending.pop(i).result()
                 
                 if chunk_data is None:
                     context.set_code(grpc.StatusCode.INTERNAL)
-                    context.set_details(f"Falha ao recuperar chunk {location.chunk_id}")
+                    context.set_details(f"Falha ao recuperar chunk {locations[i].chunk_id}")
                     return
                 
-                # 3. Enviar chunk via streaming
                 is_final = (i == total_chunks - 1)
                 yield bigfs_pb2.ChunkDownloadResponse(
                     data=chunk_data,
-                    is_final_chunk=is_final
+                    is_final_chunk=is_final,
+                    offset=locations[i].offset,
+                    file_size=file_size
                 )
                 
                 print(f"Gateway: Chunk {i+1}/{total_chunks} enviado ao cliente")
@@ -97,29 +344,63 @@ class GatewayService(bigfs_pb2_grpc.GatewayServiceServicer):
             print(f"❌ Gateway: Erro no download - {e}")
             context.set_code(grpc.StatusCode.INTERNAL)
             context.set_details(str(e))
+        finally:
+            # Cliente desconectou ou houve falha: cancela as buscas ainda em andamento
+            for future in pending.values():
+                future.cancel()
+
+    def _request_chunk(self, location, node_addr):
+        print(f"Gateway: Tentando buscar chunk {location.chunk_id} do nó {node_addr}")
+        stub = self._get_storage_stub(node_addr)
+        req = bigfs_pb2.ChunkRequest(chunk_id=location.chunk_id)
+        return stub.RetrieveChunk.future(req, timeout=10)
 
     def _fetch_chunk_with_fallback(self, location):
-        # Tentar nó primário + réplicas
+        """
+        Busca o chunk no nó primário e, se ele falhar, tenta as réplicas em sequência
+        a partir do callback da falha, sem esperar o stream chegar a este chunk.
+        Retorna uma Future com os dados do chunk (ou None se nenhum nó responder).
+        """
+        result = futures.Future()
         nodes = [location.primary_node_id] + list(location.replica_node_ids)
-        
-        for node_addr in nodes:
+        calls = []
+
+        def attempt(index):
+            if result.cancelled():
+                return
+            call = self._request_chunk(location, nodes[index])
+            calls.append(call)
+            call.add_done_callback(lambda call: on_done(call, index))
+
+        def on_done(call, index):
+            if result.cancelled():
+                return
             try:
-                print(f"Gateway: Tentando buscar chunk {location.chunk_id} do nó {node_addr}")
-                
-                with grpc.insecure_channel(node_addr) as channel:
-                    stub = bigfs_pb2_grpc.StorageServiceStub(channel)
-                    req = bigfs_pb2.ChunkRequest(chunk_id=location.chunk_id)
-                    response = stub.RetrieveChunk(req, timeout=10)
-                    
-                    print(f"Gateway: ✅ Chunk {location.chunk_id} recuperado de {node_addr}")
-                    return response.data
-                    
-            except grpc.RpcError as e:
-                print(f"Gateway: ❌ Falha ao buscar de {node_addr}: {e}")
-                continue
-        
-        print(f"Gateway: ❌ Falha total - nenhum nó disponível para chunk {location.chunk_id}")
-        return None
+                response = call.result()
+            except (grpc.RpcError, grpc.FutureCancelledError) as e:
+                print(f"Gateway: ❌ Falha ao buscar de {nodes[index]}: {e}")
+                if index + 1 < len(nodes):
+                    attempt(index + 1)
+                else:
+                    print(f"Gateway: ❌ Falha total - nenhum nó disponível para chunk {location.chunk_id}")
+                    resolve(None)
+                return
+            print(f"Gateway: ✅ Chunk {location.chunk_id} recuperado de {nodes[index]}")
+            resolve(response.data)
+
+        def resolve(chunk_data):
+            try:
+                result.set_result(chunk_data)
+            except futures.InvalidStateError:
+                pass  # Download cancelado enquanto a busca terminava
+
+        def on_cancel(future):
+            if future.cancelled() and calls:
+                calls[-1].cancel()
+
+        result.add_done_callback(on_cancel)
+        attempt(0)
+        return result
 
     def ListFiles(self, request, context):
         return self.metadata_stub.ListFiles(request)
@@ -164,7 +445,11 @@ class GatewayService(bigfs_pb2_grpc.GatewayServiceServicer):
             return bigfs_pb2.SimpleResponse(success=False, message=str(e))
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=SERVER_WORKERS),
+        options=GRPC_OPTIONS,
+        compression=grpc.Compression.NoCompression
+    )
     bigfs_pb2_grpc.add_GatewayServiceServicer_to_server(GatewayService(), server)
     server.add_insecure_port('[::]:50050')
     server.start()
@@ -1,171 +1,448 @@
 import grpc
 from concurrent import futures
+import os
 import time
 import threading
 import random
-from collections import defaultdict
+import itertools
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
 import bigfs_pb2
 import bigfs_pb2_grpc
+from channel_options import CHUNK_SIZE_BYTES
 
 HEARTBEAT_TIMEOUT = 15
 REPLICATION_FACTOR = 3
-CHUNK_SIZE_BYTES = 1 * 1024 * 1024
+# Partições do mapa de arquivos, cada uma com seu próprio lock
+NUM_SHARDS = (os.cpu_count() or 4) * 2
+# Só dicionários e locks curtos por RPC: o teto de 10 threads limitava a concorrência
+SERVER_WORKERS = max(32, (os.cpu_count() or 1) * 4)
+# Aceita os pings de keepalive que o Gateway envia com o canal ocioso (sem isso o
+# servidor responde GOAWAY "too_many_pings"), permite muitos streams por conexão e
+# derruba com keepalive conexões de clientes que sumiram.
+# so_reuseport fica desligado: o estado vive na memória deste processo, e um segundo
+# Metadata Server na mesma porta dividiria as requisições entre estados divergentes.
+SERVER_OPTIONS = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_ping_interval_without_data_ms', 5000),
+    ('grpc.max_concurrent_streams', 1000),
+    ('grpc.keepalive_time_ms', 20000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.so_reuseport', 0),
+]
+# Prazo total de um RemoveFile, compartilhado por todas as chamadas RemoveChunk
+REMOVE_DEADLINE_SECONDS = 10
+# Planos pendentes sem CommitWrite/AbortWrite depois desse prazo (Gateway que caiu no meio
+# do upload, AbortWrite perdido, GetWritePlan repetido) são descartados e seus chunks removidos
+PENDING_PLAN_TIMEOUT_SECONDS = 3600
+# Threads da limpeza em segundo plano (chunks de versões substituídas)
+CLEANUP_WORKERS = 2
+# Canais persistentes para os nós de armazenamento: o keepalive mantém a conexão
+# aquecida entre remoções e detecta conexões mortas
+NODE_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+]
+
+# Formatação e escrita dos logs ficam numa thread de fundo (QueueListener): quem loga
+# dentro de uma seção crítica só enfileira o registro
+logger = logging.getLogger('bigfs.metadata')
+
+def _setup_logging():
+    log_queue = queue.Queue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+class RWLock:
+    """
+    Lock de leitores/escritor: leituras simultâneas, escrita exclusiva. Escritores
+    em espera bloqueiam novas leituras para não sofrerem starvation.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read_lock(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write_lock(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 class MetadataService(bigfs_pb2_grpc.MetadataServiceServicer):
     def __init__(self):
-        self.storage_nodes = {}
-        self.file_to_chunks = defaultdict(list)
-        self.lock = threading.Lock()
-        print("✅ Metadata Server iniciado (Estratégia: Nó Mais Vazio).")
+        # Ordenado por último heartbeat (o mais antigo primeiro): os nós vencidos formam um prefixo
+        self.storage_nodes = OrderedDict()
+        self.nodes_lock = RWLock()
+        # Canal/stub persistente por nó de armazenamento (criar canal por chamada é o custo dominante)
+        self.node_stubs = {}
+        # Arquivos particionados por hash do nome: operações em arquivos diferentes não
+        # disputam o mesmo lock. Ordem de aquisição: lock do shard -> nodes_lock.
+        # 'responses' guarda o FileLocationResponse pronto de cada arquivo, devolvido direto
+        # pelo GetFileLocation enquanto não houver failover. 'pending' guarda os planos de
+        # uploads em andamento, por (arquivo, plan_id), com o instante de criação, até o
+        # CommitWrite/AbortWrite;
+        # 'plan_ids' guarda o plan_id da versão publicada, para repetições do CommitWrite
+        self.shards = [
+            {'files': {}, 'responses': {}, 'pending': {}, 'plan_ids': {}, 'lock': RWLock()}
+            for _ in range(NUM_SHARDS)
+        ]
+        # Cache do ListFiles: (versão, resposta). Quem altera os arquivos incrementa a versão.
+        self._list_lock = threading.Lock()
+        self._list_version = 0
+        self._list_cache = None
+        # Sequência por plano: distingue chunk_ids de planos gerados no mesmo segundo
+        self._plan_seq = itertools.count()
+        # Remoções que não precisam atrasar a resposta ao Gateway
+        self._cleanup_executor = futures.ThreadPoolExecutor(max_workers=CLEANUP_WORKERS, thread_name_prefix='cleanup')
+        logger.info("✅ Metadata Server iniciado (Estratégia: Nó Mais Vazio).")
         threading.Thread(target=self._check_dead_nodes, daemon=True).start()
 
+    def _shard(self, filename):
+        return self.shards[hash(filename) % NUM_SHARDS]
+
+    def _invalidate_list(self):
+        # Chamado depois da alteração nos shards, para que uma listagem em andamento não
+        # publique um cache com a versão nova e o conteúdo antigo
+        with self._list_lock:
+            self._list_version += 1
+
     def RegisterNode(self, request, context):
-        with self.lock:
+        with self.nodes_lock.write_lock():
             self.storage_nodes[request.address] = {
-                'last_seen': time.time(),
+                'last_seen': time.monotonic(),
                 'chunk_count': request.chunk_count
             }
-            print(f"[Metadata] Heartbeat de: {request.address} (Chunks: {request.chunk_count})")
+            self.storage_nodes.move_to_end(request.address)
+            if request.address not in self.node_stubs:
+                channel = grpc.insecure_channel(request.address, options=NODE_CHANNEL_OPTIONS)
+                self.node_stubs[request.address] = (channel, bigfs_pb2_grpc.StorageServiceStub(channel))
+        logger.info("[Metadata] Heartbeat de: %s (Chunks: %d)", request.address, request.chunk_count)
         return bigfs_pb2.SimpleResponse(success=True)
 
     def ListFiles(self, request, context):
-        with self.lock:
-            files = []
-            for filename, chunks in self.file_to_chunks.items():
-                size = (len(chunks) -1) * CHUNK_SIZE_BYTES + 1 if chunks else 0
-                files.append(bigfs_pb2.FileListResponse.FileInfo(filename=filename, size=size))
-            return bigfs_pb2.FileListResponse(files=files)
+        with self._list_lock:
+            version = self._list_version
+            if self._list_cache is not None and self._list_cache[0] == version:
+                return self._list_cache[1]
+        
+        files = []
+        for shard in self.shards:
+            with shard['lock'].read_lock():
+                for filename, chunks in shard['files'].items():
+                    size = sum(loc.size for loc in chunks)
+                    files.append(bigfs_pb2.FileListResponse.FileInfo(filename=filename, size=size))
+        response = bigfs_pb2.FileListResponse(files=files)
+        
+        with self._list_lock:
+            if self._list_cache is None or self._list_cache[0] < version:
+                self._list_cache = (version, response)
+        return response
 
     def GetWritePlan(self, request, context):
-        with self.lock:
-            active_nodes_status = list(self.storage_nodes.items())
-            if len(active_nodes_status) < REPLICATION_FACTOR:
-                msg = f"Nós insuficientes. Precisa: {REPLICATION_FACTOR}, Tem: {len(active_nodes_status)}"
-                context.set_code(grpc.StatusCode.UNAVAILABLE); context.set_details(msg)
-                return bigfs_pb2.FileLocationResponse()
+        # Só a foto das cargas precisa do lock; o plano é montado fora dele
+        with self.nodes_lock.read_lock():
+            initial_loads = {node_id: status['chunk_count'] for node_id, status in self.storage_nodes.items()}
+        if len(initial_loads) < REPLICATION_FACTOR:
+            msg = f"Nós insuficientes. Precisa: {REPLICATION_FACTOR}, Tem: {len(initial_loads)}"
+            context.set_code(grpc.StatusCode.FAILED_PRECONDITION); context.set_details(msg)
+            return bigfs_pb2.FileLocationResponse()
+
+        # Power of choices: por chunk, sorteia 2*REPLICATION_FACTOR nós e fica com os mais vazios
+        # da amostra, sem precisar ordenar todos os nós
+        node_ids = list(initial_loads)
+        loads = dict(initial_loads)
+        sample_size = min(2 * REPLICATION_FACTOR, len(node_ids))
+
+        file_size = request.size
+        num_chunks = (file_size + CHUNK_SIZE_BYTES - 1) // CHUNK_SIZE_BYTES if file_size > 0 else 1
+        plan = []
+        logger.info("[Metadata] Gerando plano para '%s' (%d chunks). Nós amostrados por carga.", request.filename, num_chunks)
+
+        plan_id = f"{int(time.time())}_{next(self._plan_seq)}"
+        prefix = f"{request.filename}_chunk"
+        suffix = f"_{plan_id}"
+        for i in range(num_chunks):
+            # A ordem aleatória da amostra desempata nós com a mesma carga, variando o primário
+            sample = random.sample(node_ids, sample_size)
+            sample.sort(key=loads.get)
+            chosen = sample[:REPLICATION_FACTOR]
+            
+            offset = i * CHUNK_SIZE_BYTES
+            size = max(0, min(CHUNK_SIZE_BYTES, file_size - offset))
+            plan.append(bigfs_pb2.ChunkLocation(
+                chunk_index=i,
+                chunk_id=f"{prefix}{i}{suffix}",
+                primary_node_id=chosen[0],
+                replica_node_ids=chosen[1:],
+                offset=offset,
+                size=size
+            ))
+            
+            # Os próximos chunks do plano já enxergam a carga recém-alocada
+            for node_id in chosen:
+                loads[node_id] += 1
+
+        # Contabiliza a alocação já no servidor: sem isso, rajadas de escrita até o próximo
+        # heartbeat veem a mesma carga antiga e caem todas nos mesmos nós. Aplica deltas para
+        # não sobrescrever os de planos concorrentes.
+        with self.nodes_lock.write_lock():
+            for node_id, count in loads.items():
+                status = self.storage_nodes.get(node_id)
+                if status is not None and count != initial_loads[node_id]:
+                    status['chunk_count'] += count - initial_loads[node_id]
+
+        # O plano só é publicado no CommitWrite, depois que o Gateway armazenou todos os
+        # chunks: um upload que falha não substitui a versão anterior do arquivo
+        shard = self._shard(request.filename)
+        with shard['lock'].write_lock():
+            # Tupla: o plano publicado é imutável (a promoção de réplicas gera um novo)
+            shard['pending'][(request.filename, plan_id)] = (tuple(plan), time.monotonic())
+        return bigfs_pb2.FileLocationResponse(is_sharded=num_chunks > 1, locations=plan, plan_id=plan_id)
 
-            sorted_nodes = sorted(active_nodes_status, key=lambda item: item[1]['chunk_count'])
-            available_node_addrs = [node_id for node_id, status in sorted_nodes]
-
-            num_chunks = (request.size + CHUNK_SIZE_BYTES - 1) // CHUNK_SIZE_BYTES if request.size > 0 else 1
-            plan = []
-            print(f"[Metadata] Gerando plano para '{request.filename}' ({num_chunks} chunks). Nós ordenados por carga.")
-
-            for i in range(num_chunks):
-                if len(available_node_addrs) < REPLICATION_FACTOR:
-                    context.set_code(grpc.StatusCode.INTERNAL); context.set_details("Falha na lógica de alocação.")
-                    return bigfs_pb2.FileLocationResponse()
-                
-                chosen_nodes = available_node_addrs[:REPLICATION_FACTOR]
-                primary, replicas = chosen_nodes[0], chosen_nodes[1:]
-                
-                chunk_id = f"{request.filename}_chunk{i}_{int(time.time())}"
-                plan.append(bigfs_pb2.ChunkLocation(chunk_index=i, chunk_id=chunk_id, primary_node_id=primary, replica_node_ids=replicas))
-                
-                # Rotaciona a lista de nós para que o mesmo nó não seja sempre o primário
-                available_node_addrs = available_node_addrs[1:] + available_node_addrs[:1]
-
-            self.file_to_chunks[request.filename] = plan
-            return bigfs_pb2.FileLocationResponse(is_sharded=num_chunks > 1, locations=plan)
+    def CommitWrite(self, request, context):
+        shard = self._shard(request.filename)
+        with shard['lock'].write_lock():
+            entry = shard['pending'].pop((request.filename, request.plan_id), None)
+            if entry is None:
+                # O Gateway repete o CommitWrite quando a resposta se perde: se o plano já
+                # foi publicado, a repetição também é um sucesso
+                if shard['plan_ids'].get(request.filename) == request.plan_id:
+                    return bigfs_pb2.SimpleResponse(success=True)
+                context.set_code(grpc.StatusCode.NOT_FOUND); context.set_details("Plano de escrita não encontrado.")
+                return bigfs_pb2.SimpleResponse(success=False, message="Plano de escrita não encontrado")
+            plan = entry[0]
+            previous = shard['files'].get(request.filename)
+            shard['files'][request.filename] = plan
+            shard['plan_ids'][request.filename] = request.plan_id
+            shard['responses'][request.filename] = bigfs_pb2.FileLocationResponse(is_sharded=len(plan) > 1, locations=plan)
+        self._invalidate_list()
+        logger.info("[Metadata] ✅ Plano de '%s' publicado (%d chunks)", request.filename, len(plan))
+        
+        # A versão anterior deixou de ser referenciada: seus chunks saem dos nós em segundo
+        # plano, sem atrasar a confirmação do upload
+        if previous is not None:
+            self._cleanup_executor.submit(self._remove_chunks, previous, None)
+        return bigfs_pb2.SimpleResponse(success=True)
+
+    def AbortWrite(self, request, context):
+        shard = self._shard(request.filename)
+        with shard['lock'].write_lock():
+            entry = shard['pending'].pop((request.filename, request.plan_id), None)
+        if entry is None:
+            return bigfs_pb2.RemoveFileResponse(success=False, message="Plano de escrita não encontrado")
+        plan = entry[0]
+        
+        logger.info("[Metadata] Upload de '%s' abortado, removendo chunks já gravados", request.filename)
+        removed_chunks, failed_chunks = self._remove_chunks(plan, context)
+        return bigfs_pb2.RemoveFileResponse(
+            success=True,
+            message=f"Plano descartado. {len(removed_chunks)} chunks removidos.",
+            removed_chunks=removed_chunks,
+            failed_chunks=failed_chunks
+        )
     
     def GetFileLocation(self, request, context):
-        with self.lock:
-            if request.filename not in self.file_to_chunks:
+        shard = self._shard(request.filename)
+        with shard['lock'].read_lock():
+            locations = shard['files'].get(request.filename)
+            if locations is None:
+                context.set_code(grpc.StatusCode.NOT_FOUND); context.set_details("Arquivo não encontrado.")
+                return bigfs_pb2.FileLocationResponse()
+            
+            with self.nodes_lock.read_lock():
+                alive = self.storage_nodes
+                all_primaries_alive = all(loc.primary_node_id in alive for loc in locations)
+            if all_primaries_alive:
+                return shard['responses'][request.filename]
+        
+        # Algum primário caiu: a promoção de réplicas altera o plano e exige o lock de escrita
+        with shard['lock'].write_lock(), self.nodes_lock.read_lock():
+            current = shard['files'].get(request.filename)
+            if current is None:
                 context.set_code(grpc.StatusCode.NOT_FOUND); context.set_details("Arquivo não encontrado.")
                 return bigfs_pb2.FileLocationResponse()
             
-            locations = self.file_to_chunks[request.filename]
-            for loc in locations:
+            # Copy-on-write: os ChunkLocation publicados nunca são alterados, quem já leu o
+            # plano antigo continua com uma cópia consistente
+            locations = []
+            promoted_replicas = []
+            for loc in current:
                 if loc.primary_node_id not in self.storage_nodes:
-                    promoted = False
-                    for replica in loc.replica_node_ids:
-                        if replica in self.storage_nodes:
-                            loc.primary_node_id = replica; promoted = True
-                            print(f"[Metadata] Failover: {replica} promovido para primário.")
-                            break
-                    if not promoted:
-                        context.set_code(grpc.StatusCode.UNAVAILABLE); context.set_details(f"Nenhum nó disponível para chunk {loc.chunk_id}")
+                    replica = next((r for r in loc.replica_node_ids if r in self.storage_nodes), None)
+                    if replica is None:
+                        context.set_code(grpc.StatusCode.FAILED_PRECONDITION); context.set_details(f"Nenhum nó disponível para chunk {loc.chunk_id}")
                         return bigfs_pb2.FileLocationResponse()
-            return bigfs_pb2.FileLocationResponse(is_sharded=len(locations) > 1, locations=locations)
+                    promoted = bigfs_pb2.ChunkLocation(); promoted.CopyFrom(loc)
+                    promoted.primary_node_id = replica; loc = promoted
+                    promoted_replicas.append(replica)
+                locations.append(loc)
+            locations = shard['files'][request.filename] = tuple(locations)
+            response = shard['responses'][request.filename] = bigfs_pb2.FileLocationResponse(is_sharded=len(locations) > 1, locations=locations)
+        
+        # Logs fora do lock: quem espera pelo shard não paga a formatação
+        for replica in promoted_replicas:
+            logger.info("[Metadata] Failover: %s promovido para primário.", replica)
+        return response
 
     def _check_dead_nodes(self):
         while True:
-            time.sleep(HEARTBEAT_TIMEOUT)
-            with self.lock:
-                now = time.time(); dead = [nid for nid, status in self.storage_nodes.items() if now - status['last_seen'] > HEARTBEAT_TIMEOUT]
-                if dead:
-                    print(f"[Metadata] Nós inativos detectados: {dead}")
-                    for nid in dead:
-                        if nid in self.storage_nodes:
-                            del self.storage_nodes[nid]
+            with self.nodes_lock.write_lock():
+                cutoff = time.monotonic() - HEARTBEAT_TIMEOUT; dead = []
+                while self.storage_nodes:
+                    nid, status = next(iter(self.storage_nodes.items()))
+                    if status['last_seen'] > cutoff:
+                        break
+                    del self.storage_nodes[nid]; dead.append(nid)
+                    if nid in self.node_stubs:
+                        self.node_stubs.pop(nid)[0].close()
+                # Dorme só até o prazo do nó mais antigo
+                oldest = next(iter(self.storage_nodes.values()), None)
+                wait = oldest['last_seen'] - cutoff if oldest else HEARTBEAT_TIMEOUT
+            if dead:
+                logger.info("[Metadata] Nós inativos detectados: %s", dead)
+            self._reap_pending_plans()
+            time.sleep(max(wait, 0.1))
+
+    def _reap_pending_plans(self):
+        cutoff = time.monotonic() - PENDING_PLAN_TIMEOUT_SECONDS
+        for shard in self.shards:
+            if not shard['pending']:
+                continue
+            with shard['lock'].write_lock():
+                stale = [key for key, (_, created) in shard['pending'].items() if created < cutoff]
+                plans = [shard['pending'].pop(key)[0] for key in stale]
+            for (filename, _), plan in zip(stale, plans):
+                logger.info("[Metadata] Plano pendente de '%s' expirou, removendo chunks já gravados", filename)
+                self._cleanup_executor.submit(self._remove_chunks, plan, None)
 
     def RemoveFile(self, request, context):
         """
         Remove arquivo dos metadados e coordena remoção de chunks nos storage nodes
         """
-        with self.lock:
-            if request.filename not in self.file_to_chunks:
+        shard = self._shard(request.filename)
+        with shard['lock'].write_lock():
+            # Retira o arquivo dos metadados já aqui; a limpeza nos nós roda sem segurar o lock
+            chunks_to_remove = shard['files'].pop(request.filename, None)
+            if chunks_to_remove is None:
                 return bigfs_pb2.RemoveFileResponse(
                     success=False,
                     message="Arquivo não encontrado"
                 )
-            
-            # Obter lista de chunks para remover
-            chunks_to_remove = self.file_to_chunks[request.filename]
-            removed_chunks = []
-            failed_chunks = []
-            
-            print(f"[Metadata] Iniciando remoção de '{request.filename}' ({len(chunks_to_remove)} chunks)")
-            
-            # Para cada chunk, remover de todos os nós (primário + réplicas)
-            for chunk_location in chunks_to_remove:
-                chunk_id = chunk_location.chunk_id
-                nodes_to_clean = [chunk_location.primary_node_id] + list(chunk_location.replica_node_ids)
-                
-                chunk_removed = False
-                for node_addr in nodes_to_clean:
-                    if node_addr in self.storage_nodes:  # Só tenta se nó está ativo
-                        try:
-                            with grpc.insecure_channel(node_addr) as channel:
-                                stub = bigfs_pb2_grpc.StorageServiceStub(channel)
-                                req = bigfs_pb2.ChunkRequest(chunk_id=chunk_id)
-                                response = stub.RemoveChunk(req, timeout=10)
-                                
-                                if response.success:
-                                    chunk_removed = True
-                                    # Decrementar contador de chunks do nó
-                                    if node_addr in self.storage_nodes:
-                                        self.storage_nodes[node_addr]['chunk_count'] = max(
-                                            0, self.storage_nodes[node_addr]['chunk_count'] - 1
-                                        )
-                                    print(f"[Metadata] ✅ Chunk {chunk_id} removido de {node_addr}")
-                                
-                        except grpc.RpcError as e:
-                            print(f"[Metadata] ❌ Falha ao remover chunk {chunk_id} de {node_addr}: {e}")
-                            continue
-                
-                if chunk_removed:
-                    removed_chunks.append(chunk_id)
-                else:
-                    failed_chunks.append(chunk_id)
-            
-            # Remover arquivo dos metadados
-            del self.file_to_chunks[request.filename]
-            
-            print(f"[Metadata] ✅ Remoção concluída: {len(removed_chunks)} chunks removidos, {len(failed_chunks)} falharam")
-            
-            return bigfs_pb2.RemoveFileResponse(
-                success=True,
-                message=f"Arquivo removido. {len(removed_chunks)} chunks removidos.",
-                removed_chunks=removed_chunks,
-                failed_chunks=failed_chunks
-            )
+            del shard['responses'][request.filename]
+            shard['plan_ids'].pop(request.filename, None)
+        self._invalidate_list()
+        
+        logger.info("[Metadata] Iniciando remoção de '%s' (%d chunks)", request.filename, len(chunks_to_remove))
+        removed_chunks, failed_chunks = self._remove_chunks(chunks_to_remove, context)
+        logger.info("[Metadata] ✅ Remoção concluída: %d chunks removidos, %d falharam", len(removed_chunks), len(failed_chunks))
+        
+        return bigfs_pb2.RemoveFileResponse(
+            success=True,
+            message=f"Arquivo removido. {len(removed_chunks)} chunks removidos.",
+            removed_chunks=removed_chunks,
+            failed_chunks=failed_chunks
+        )
+
+    def _remove_chunks(self, chunks_to_remove, context):
+        """
+        Remove os chunks do primário e das réplicas ativos; retorna (removidos, falhas)
+        """
+        with self.nodes_lock.read_lock():
+            node_stubs = {addr: stub for addr, (_, stub) in self.node_stubs.items() if addr in self.storage_nodes}
+        
+        # Um único prazo para a remoção inteira (limitado pelo prazo do próprio cliente, se
+        # houver): nós lentos não multiplicam a latência pelo número de chunks
+        budget = REMOVE_DEADLINE_SECONDS
+        if context is not None and context.time_remaining() is not None:
+            budget = min(budget, context.time_remaining())
+        deadline = time.monotonic() + budget
+        
+        # Uma chamada assíncrona por (chunk, nó) ativo, primário + réplicas: todas são
+        # disparadas de uma vez e o poller do gRPC cuida do I/O, sem threads extras
+        pending = []
+        for chunk_location in chunks_to_remove:
+            chunk_id = chunk_location.chunk_id
+            req = bigfs_pb2.ChunkRequest(chunk_id=chunk_id)
+            for node_addr in [chunk_location.primary_node_id] + list(chunk_location.replica_node_ids):
+                if node_addr in node_stubs:  # Só tenta se nó está ativo
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break  # Prazo esgotado: o chunk fica entre os que falharam
+                    try:
+                        future = node_stubs[node_addr].RemoveChunk.future(req, timeout=remaining)
+                    except ValueError as e:
+                        # O canal foi fechado por _check_dead_nodes depois da foto dos stubs
+                        logger.info("[Metadata] ❌ Falha ao remover chunk %s de %s: %s", chunk_id, node_addr, e)
+                        continue
+                    pending.append((chunk_id, node_addr, future))
+        
+        removed = set()
+        removed_per_node = Counter()
+        for chunk_id, node_addr, future in pending:
+            try:
+                response = future.result()
+            except grpc.RpcError as e:
+                logger.info("[Metadata] ❌ Falha ao remover chunk %s de %s: %s", chunk_id, node_addr, e)
+                continue
+            if response.success:
+                removed.add(chunk_id)
+                removed_per_node[node_addr] += 1
+                logger.info("[Metadata] ✅ Chunk %s removido de %s", chunk_id, node_addr)
+        
+        # Decrementar contadores de chunks dos nós de uma vez (o nó pode ter caído nesse meio tempo)
+        with self.nodes_lock.write_lock():
+            for node_addr, count in removed_per_node.items():
+                status = self.storage_nodes.get(node_addr)
+                if status is not None:
+                    status['chunk_count'] = max(0, status['chunk_count'] - count)
+        
+        removed_chunks = [loc.chunk_id for loc in chunks_to_remove if loc.chunk_id in removed]
+        failed_chunks = [loc.chunk_id for loc in chunks_to_remove if loc.chunk_id not in removed]
+        return removed_chunks, failed_chunks
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    _setup_logging()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=SERVER_WORKERS), options=SERVER_OPTIONS)
     bigfs_pb2_grpc.add_MetadataServiceServicer_to_server(MetadataService(), server)
     server.add_insecure_port('[::]:50051'); server.start()
-    print("📡 Metadata Server escutando na porta 50051.")
+    logger.info("📡 Metadata Server escutando na porta 50051.")
     server.wait_for_termination()
 
 if __name__ == '__main__': serve()
\ No newline at end of file
@@ -2,6 +2,7 @@ import grpc
 import time
 import threading
 import concurrent.futures
+import itertools
 import os
 import sys
 import random
@@ -11,6 +12,13 @@ from dataclasses import dataclass
 from typing import List, Dict, Any
 import bigfs_pb2
 import bigfs_pb2_grpc
+from channel_options import GRPC_OPTIONS
+
+COMPRESSION_ALGORITHMS = {
+    'none': grpc.Compression.NoCompression,
+    'gzip': grpc.Compression.Gzip,
+    'deflate': grpc.Compression.Deflate,
+}
 
 @dataclass
 class TestResult:
@@ -28,8 +36,16 @@ class TestConfig:
     concurrent_clients: int = 5
     file_sizes_mb: List[float] = None
     test_files_dir: str = "test_files"
+    # 128 KiB menos folga para cabeçalhos do proto/gRPC: cada mensagem cabe num tier de buffer
+    upload_chunk_bytes: int = 128 * 1024 - 256
+    # Compressão do canal com o gateway: "none", "gzip" ou "deflate". Com os arquivos
+    # aleatórios padrão só mede o custo de CPU; com compressible_data mede também o ganho
+    compression: str = "none"
+    compressible_data: bool = False
     
     def __post_init__(self):
+        if self.compression not in COMPRESSION_ALGORITHMS:
+            raise ValueError(f"Compressão inválida: '{self.compression}' (use {'|'.join(COMPRESSION_ALGORITHMS)})")
         if self.file_sizes_mb is None:
             self.file_sizes_mb = [0.1, 1.0, 5.0, 10.0, 50.0]
 
@@ -38,6 +54,11 @@ class BigFSPerformanceTester:
         self.config = config
         self.results: List[TestResult] = []
         self.test_files = {}
+        # Canal único com o gateway, compartilhado por todas as operações e workers
+        # (canais gRPC são thread-safe): sem handshake nem warmup por operação
+        self._client_lock = threading.Lock()
+        self._channel = None
+        self._stub = None
         self._setup_test_environment()
     
     def _setup_test_environment(self):
@@ -47,7 +68,8 @@ class BigFSPerformanceTester:
         
         print("🔧 Preparando arquivos de teste...")
         for size_mb in self.config.file_sizes_mb:
-            filename = f"test_file_{size_mb}MB.dat"
+            kind = "_text" if self.config.compressible_data else ""
+            filename = f"test_file_{size_mb}MB{kind}.dat"
             filepath = os.path.join(self.config.test_files_dir, filename)
             
             if not os.path.exists(filepath):
@@ -59,23 +81,49 @@ class BigFSPerformanceTester:
     def _create_test_file(self, filepath: str, size_mb: float):
         """Cria arquivo de teste com tamanho específico"""
         size_bytes = int(size_mb * 1024 * 1024)
-        chunk_size = 64 * 1024  # 64KB chunks para criação eficiente
+        chunk_size = 4 * 1024 * 1024  # 4MB por escrita
+        # PRNG em espaço de usuário: os dados de teste não precisam de aleatoriedade
+        # criptográfica, e os.urandom custava uma chamada ao kernel a cada 64KB
+        rng = random.Random()
+        if self.config.compressible_data:
+            # Texto aleatório de um alfabeto pequeno: comprimível como dados textuais
+            alphabet = string.ascii_lowercase + ' ' * 6 + '\n'
+            text = ''.join(rng.choices(alphabet, k=64 * 1024)).encode()
+            block = text * (chunk_size // len(text))
+            next_chunk = lambda n: block[:n]
+        else:
+            next_chunk = rng.randbytes
         
         with open(filepath, 'wb') as f:
             remaining = size_bytes
             while remaining > 0:
-                chunk = os.urandom(min(chunk_size, remaining))
+                chunk = next_chunk(min(chunk_size, remaining))
                 f.write(chunk)
                 remaining -= len(chunk)
     
     def _get_client(self):
-        """Cria cliente BigFS conectado ao gateway"""
-        try:
-            channel = grpc.insecure_channel(self.config.gateway_address)
-            grpc.channel_ready_future(channel).result(timeout=5)
-            return bigfs_pb2_grpc.GatewayServiceStub(channel), channel
-        except grpc.FutureTimeoutError:
-            raise ConnectionError(f"Não foi possível conectar ao gateway em {self.config.gateway_address}")
+        """Retorna o stub do gateway, conectando na primeira chamada"""
+        with self._client_lock:
+            if self._stub is None:
+                channel = grpc.insecure_channel(
+                    self.config.gateway_address,
+                    options=GRPC_OPTIONS,
+                    compression=COMPRESSION_ALGORITHMS[self.config.compression]
+                )
+                try:
+                    grpc.channel_ready_future(channel).result(timeout=5)
+                except grpc.FutureTimeoutError:
+                    channel.close()
+                    raise ConnectionError(f"Não foi possível conectar ao gateway em {self.config.gateway_address}")
+                self._channel, self._stub = channel, bigfs_pb2_grpc.GatewayServiceStub(channel)
+            return self._stub
+    
+    def close(self):
+        """Fecha o canal com o gateway"""
+        with self._client_lock:
+            if self._channel is not None:
+                self._channel.close()
+                self._channel = self._stub = None
     
     def _upload_file(self, local_path: str, remote_path: str) -> TestResult:
         """Testa upload de arquivo individual"""
@@ -83,18 +131,28 @@ class BigFSPerformanceTester:
         start_time = time.time()
         
         try:
-            stub, channel = self._get_client()
+            stub = self._get_client()
             
             def upload_generator():
-                yield bigfs_pb2.ChunkUploadRequest(
-                    metadata=bigfs_pb2.FileMetadata(remote_path=remote_path)
-                )
                 with open(local_path, 'rb') as f:
+                    # O primeiro bloco segue junto com os metadados
+                    yield bigfs_pb2.ChunkUploadRequest(
+                        metadata=bigfs_pb2.FileMetadata(
+                            remote_path=remote_path,
+                            total_size=os.path.getsize(local_path)
+                        ),
+                        data=f.read(self.config.upload_chunk_bytes)
+                    )
+                    # Uma única mensagem reaproveitada para os blocos seguintes: o gRPC
+                    # serializa cada mensagem antes de pedir a próxima ao gerador
+                    chunk_size = self.config.upload_chunk_bytes
+                    message = bigfs_pb2.ChunkUploadRequest()
                     while True:
-                        data = f.read(1024 * 1024)  # 1MB chunks
+                        data = f.read(chunk_size)
                         if not data:
                             break
-                        yield bigfs_pb2.ChunkUploadRequest(data=data)
+                        message.data = data
+                        yield message
             
             response = stub.UploadFile(upload_generator())
             duration = time.time() - start_time
@@ -108,11 +166,6 @@ class BigFSPerformanceTester:
         except Exception as e:
             duration = time.time() - start_time
             return TestResult("upload", file_size_mb, duration, 0, False, str(e))
-        finally:
-            try:
-                channel.close()
-            except:
-                pass
     
     def _download_file(self, remote_path: str, local_path: str) -> TestResult:
         """Testa download de arquivo individual"""
@@ -120,7 +173,7 @@ class BigFSPerformanceTester:
         file_size_mb = 0
         
         try:
-            stub, channel = self._get_client()
+            stub = self._get_client()
             
             file_req = bigfs_pb2.FileRequest(filename=remote_path)
             response_stream = stub.DownloadFile(file_req)
@@ -140,18 +193,13 @@ class BigFSPerformanceTester:
         except Exception as e:
             duration = time.time() - start_time
             return TestResult("download", file_size_mb, duration, 0, False, str(e))
-        finally:
-            try:
-                channel.close()
-            except:
-                pass
     
     def _list_files(self) -> TestResult:
         """Testa operação de listagem de arquivos"""
         start_time = time.time()
         
         try:
-            stub, channel = self._get_client()
+            stub = self._get_client()
             
             response = stub.ListFiles(bigfs_pb2.PathRequest(path=""))
             duration = time.time() - start_time
@@ -164,18 +212,13 @@ class BigFSPerformanceTester:
         except Exception as e:
             duration = time.time() - start_time
             return TestResult("list", 0, duration, 0, False, str(e))
-        finally:
-            try:
-                channel.close()
-            except:
-                pass
     
     def _remove_file(self, remote_path: str) -> TestResult:
         """Testa remoção de arquivo"""
         start_time = time.time()
         
         try:
-            stub, channel = self._get_client()
+            stub = self._get_client()
             
             file_req = bigfs_pb2.FileRequest(filename=remote_path)
             response = stub.RemoveFile(file_req)
@@ -190,11 +233,6 @@ class BigFSPerformanceTester:
         except Exception as e:
             duration = time.time() - start_time
             return TestResult("remove", 0, duration, 0, False, str(e))
-        finally:
-            try:
-                channel.close()
-            except:
-                pass
     
     def test_sequential_operations(self):
         """Teste sequencial de operações básicas"""
@@ -223,7 +261,6 @@ class BigFSPerformanceTester:
                 print(f"  ⬇️  Download: {result.throughput_mbps:.2f} MB/s ({result.duration_seconds:.2f}s)")
             else:
                 print(f"  ❌ Download falhou: {result.error_message}")
-                print(f"  ❌ Download falhou: {result.error_message}")
             
             # Cleanup
             if os.path.exists(download_file):
@@ -246,7 +283,6 @@ class BigFSPerformanceTester:
                 print(f"  Worker {worker_id}: {result.throughput_mbps:.2f} MB/s")
             else:
                 print(f"  Worker {worker_id}: FALHA - {result.error_message}")
-                print(f"  Worker {worker_id}: FALHA - {result.error_message}")
             
             # Cleanup
             self._remove_file(remote_file)
@@ -274,7 +310,6 @@ class BigFSPerformanceTester:
             print(f"  📊 Throughput médio por cliente: {avg_throughput:.2f} MB/s")
             print(f"  ⏱️  Tempo total: {total_time:.2f}s")
             print(f"  ✅ Sucessos: {len(successful_results)}/{len(results)}")
-            print(f"  ✅ Sucessos: {len(successful_results)}/{len(results)}")
     
     def test_mixed_workload(self):
         """Teste de carga mista simulando uso real"""
@@ -283,20 +318,24 @@ class BigFSPerformanceTester:
         
         operations = ['upload', 'download', 'list']
         weights = [0.4, 0.4, 0.2]  # 40% upload, 40% download, 20% list
+        # Pesos acumulados uma vez: random.choices não reconstrói a distribuição a cada sorteio
+        cum_weights = list(itertools.accumulate(weights))
         
         def worker_mixed_load(worker_id: int):
             worker_results = []
-            end_time = time.time() + self.config.test_duration_seconds
+            # Gerador por worker: sem disputa pelo estado do random global entre threads
+            rng = random.Random()
+            end_time = time.monotonic() + self.config.test_duration_seconds
             
             uploaded_files = []
             
-            while time.time() < end_time:
-                operation = random.choices(operations, weights=weights)[0]
+            while time.monotonic() < end_time:
+                operation = rng.choices(operations, cum_weights=cum_weights)[0]
                 
                 if operation == 'upload':
-                    size_mb = random.choice(self.config.file_sizes_mb)
+                    size_mb = rng.choice(self.config.file_sizes_mb)
                     local_file = self.test_files[size_mb]
-                    remote_file = f"mixed_load_{worker_id}_{int(time.time())}_{random.randint(1000,9999)}.dat"
+                    remote_file = f"mixed_load_{worker_id}_{int(time.time())}_{rng.randint(1000,9999)}.dat"
                     
                     result = self._upload_file(local_file, remote_file)
                     if result.success:
@@ -304,7 +343,7 @@ class BigFSPerformanceTester:
                     worker_results.append(result)
                 
                 elif operation == 'download' and uploaded_files:
-                    remote_file = random.choice(uploaded_files)
+                    remote_file = rng.choice(uploaded_files)
                     local_file = f"temp_download_{worker_id}_{int(time.time())}.dat"
                     
                     result = self._download_file(remote_file, local_file)
@@ -317,7 +356,7 @@ class BigFSPerformanceTester:
                     result = self._list_files()
                     worker_results.append(result)
                 
-                time.sleep(random.uniform(0.1, 0.5))  # Simula pausa entre operações
+                time.sleep(rng.uniform(0.1, 0.5))  # Simula pausa entre operações
             
             # Cleanup
             for remote_file in uploaded_files:
@@ -401,81 +440,104 @@ class BigFSPerformanceTester:
     
     def generate_report(self):
         """Gera relatório final de desempenho"""
-        print("\n" + "=" * 80)
-        print("📋 RELATÓRIO FINAL DE DESEMPENHO")
-        print("=" * 80)
+        # Linhas acumuladas e escritas de uma vez: uma única escrita no stdout por relatório
+        lines = ["\n" + "=" * 80, "📋 RELATÓRIO FINAL DE DESEMPENHO", "=" * 80]
         
         if not self.results:
-            print("❌ Nenhum resultado disponível")
+            lines.append("❌ Nenhum resultado disponível")
+            sys.stdout.write("\n".join(lines) + "\n")
             return
         
-        # Estatísticas por operação
+        # Estatísticas por operação: uma única passada separa os resultados em colunas
+        # (latências, throughputs, falhas) por operação; as reduções rodam sobre listas de floats
         operations = {}
         for result in self.results:
-            if result.operation not in operations:
-                operations[result.operation] = []
-            operations[result.operation].append(result)
-        
-        for op_name, op_results in operations.items():
-            successful = [r for r in op_results if r.success]
-            failed = [r for r in op_results if not r.success]
-            
-            print(f"\n📊 {op_name.upper()}:")
-            print(f"  Total de operações: {len(op_results)}")
-            print(f"  Sucessos: {len(successful)} ({(len(successful)/len(op_results)*100):.1f}%)")
-            print(f"  Falhas: {len(failed)}")
-            
-            if successful:
-                durations = [r.duration_seconds for r in successful]
-                throughputs = [r.throughput_mbps for r in successful if r.throughput_mbps > 0]
-                
-                print(f"  Latência média: {statistics.mean(durations):.3f}s")
-                print(f"  Latência mediana: {statistics.median(durations):.3f}s")
+            columns = operations.get(result.operation)
+            if columns is None:
+                columns = operations[result.operation] = {'durations': [], 'throughputs': [], 'failed': 0}
+            if result.success:
+                columns['durations'].append(result.duration_seconds)
+                columns['throughputs'].append(result.throughput_mbps)
+            else:
+                columns['failed'] += 1
+        
+        for op_name, columns in operations.items():
+            durations = columns['durations']
+            throughputs = [t for t in columns['throughputs'] if t > 0]
+            total = len(durations) + columns['failed']
+            
+            lines.append(f"\n📊 {op_name.upper()}:")
+            lines.append(f"  Total de operações: {total}")
+            lines.append(f"  Sucessos: {len(durations)} ({(len(durations)/total*100):.1f}%)")
+            lines.append(f"  Falhas: {columns['failed']}")
+            
+            if durations:
+                lines.append(f"  Latência média: {statistics.fmean(durations):.3f}s")
+                lines.append(f"  Latência mediana: {statistics.median(durations):.3f}s")
                 if len(durations) > 1:
-                    print(f"  Desvio padrão latência: {statistics.stdev(durations):.3f}s")
+                    lines.append(f"  Desvio padrão latência: {statistics.stdev(durations):.3f}s")
                 
                 if throughputs:
-                    print(f"  Throughput médio: {statistics.mean(throughputs):.2f} MB/s")
-                    print(f"  Throughput máximo: {max(throughputs):.2f} MB/s")
-                    print(f"  Throughput mínimo: {min(throughputs):.2f} MB/s")
+                    lines.append(f"  Throughput médio: {statistics.fmean(throughputs):.2f} MB/s")
+                    lines.append(f"  Throughput máximo: {max(throughputs):.2f} MB/s")
+                    lines.append(f"  Throughput mínimo: {min(throughputs):.2f} MB/s")
         
         # Resumo geral
         total_ops = len(self.results)
-        total_successful = len([r for r in self.results if r.success])
+        total_successful = sum(len(columns['durations']) for columns in operations.values())
         overall_success_rate = (total_successful / total_ops * 100) if total_ops > 0 else 0
         
-        print(f"\n🎯 RESUMO GERAL:")
-        print(f"  Total de operações testadas: {total_ops}")
-        print(f"  Taxa de sucesso geral: {overall_success_rate:.1f}%")
+        lines.append(f"\n🎯 RESUMO GERAL:")
+        lines.append(f"  Total de operações testadas: {total_ops}")
+        lines.append(f"  Taxa de sucesso geral: {overall_success_rate:.1f}%")
         
         # Recomendações
-        print(f"\n💡 RECOMENDAÇÕES:")
-        upload_results = [r for r in self.results if r.operation == 'upload' and r.success]
-        if upload_results:
-            avg_upload_throughput = statistics.mean([r.throughput_mbps for r in upload_results])
+        lines.append(f"\n💡 RECOMENDAÇÕES:")
+        upload = operations.get('upload')
+        if upload and upload['durations']:
+            avg_upload_throughput = statistics.fmean(upload['throughputs'])
             if avg_upload_throughput < 10:
-                print("  - Throughput de upload baixo. Considere otimizar tamanho de chunks ou paralelismo")
+                lines.append("  - Throughput de upload baixo. Considere otimizar tamanho de chunks ou paralelismo")
             if overall_success_rate < 95:
-                print("  - Taxa de erro alta. Verifique estabilidade da rede e nós de storage")
+                lines.append("  - Taxa de erro alta. Verifique estabilidade da rede e nós de storage")
         
-        print("\n✅ Teste de desempenho concluído!")
+        lines.append("\n✅ Teste de desempenho concluído!")
+        sys.stdout.write("\n".join(lines) + "\n")
+
+DATA_KINDS = ('random', 'text')
+
+def _usage():
+    print("Uso: python3 performance_test.py <gateway_address> [duration] [clients] [none|gzip|deflate] [random|text]")
+    print("Exemplo: python3 performance_test.py localhost:50050 120 8 gzip text")
+    sys.exit(1)
 
 def main():
     if len(sys.argv) < 2:
-        print("Uso: python3 performance_test.py <gateway_address> [duration] [clients]")
-        print("Exemplo: python3 performance_test.py localhost:50050 120 8")
-        sys.exit(1)
+        _usage()
     
-    config = TestConfig(
-        gateway_address=sys.argv[1],
-        test_duration_seconds=int(sys.argv[2]) if len(sys.argv) > 2 else 60,
-        concurrent_clients=int(sys.argv[3]) if len(sys.argv) > 3 else 5
-    )
+    # Dados "text" são compressíveis: comparam o ganho da compressão com os aleatórios
+    data_kind = sys.argv[5] if len(sys.argv) > 5 else "random"
+    if data_kind not in DATA_KINDS:
+        print(f"❌ Tipo de dados inválido: '{data_kind}'")
+        _usage()
+    try:
+        config = TestConfig(
+            gateway_address=sys.argv[1],
+            test_duration_seconds=int(sys.argv[2]) if len(sys.argv) > 2 else 60,
+            concurrent_clients=int(sys.argv[3]) if len(sys.argv) > 3 else 5,
+            compression=sys.argv[4] if len(sys.argv) > 4 else "none",
+            compressible_data=data_kind == "text"
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        _usage()
     
     print("🚀 INICIANDO TESTE DE DESEMPENHO BIGFS")
     print(f"Gateway: {config.gateway_address}")
     print(f"Duração: {config.test_duration_seconds}s")
     print(f"Clientes concorrentes: {config.concurrent_clients}")
+    print(f"Compressão: {config.compression}")
+    print(f"Dados: {data_kind}")
     
     tester = BigFSPerformanceTester(config)
     
@@ -495,12 +557,14 @@ def main():
         print(f"\n❌ Erro durante o teste: {e}")
     finally:
         # Cleanup
+        tester.close()
         if os.path.exists(config.test_files_dir):
-            for file in os.listdir(config.test_files_dir):
-                try:
-                    os.remove(os.path.join(config.test_files_dir, file))
-                except:
-                    pass
+            with os.scandir(config.test_files_dir) as entries:
+                for entry in entries:
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,81 +4,289 @@ import time
 import os
 import sys
 import threading
+import hashlib
+import itertools
+import queue
+import tempfile
 import bigfs_pb2
 import bigfs_pb2_grpc
+from channel_options import GRPC_OPTIONS
+
+# Downloads concorrentes (o gateway busca vários chunks em paralelo) somados aos
+# StoreChunk de upload e replicação esgotavam as 10 threads
+SERVER_WORKERS = 64
+# max_concurrent_streams vale por conexão HTTP/2, não por servidor: limita o que um
+# único par (Gateway, outro nó, Metadata Server) abre de uma vez, mas a soma das conexões
+# ainda pode enfileirar atrás das threads. maximum_concurrent_rpcs não é usado porque
+# rejeita o excesso com RESOURCE_EXHAUSTED em vez de segurá-lo, e o Gateway não repete
+# StoreChunk/RetrieveChunk.
+SERVER_OPTIONS = GRPC_OPTIONS + [
+    ('grpc.max_concurrent_streams', SERVER_WORKERS),
+]
+# Chunks replicando ao mesmo tempo. Cada StoreChunk.future com iterador (client-streaming)
+# ocupa uma thread do gRPC que consome a fila de pedaços até o fim do stream; com
+# REPLICATION_FACTOR 3 (duas réplicas por chunk) são no máximo 32 dessas threads
+REPLICATION_MAX_CHUNKS = 16
+HEARTBEAT_INTERVAL_SECONDS = 5
+# Keepalive no canal de heartbeat, aceito pelo Metadata Server mesmo com o canal ocioso
+HEARTBEAT_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 10000),
+    ('grpc.keepalive_timeout_ms', 5000),
+    ('grpc.keepalive_permit_without_calls', 1),
+]
+
+# Leitura e escrita dos chunks direto nos descritores (os.read/os.write), sem a camada
+# de buffer do objeto file: o chunk vai do kernel para o bytes que o protobuf usa.
+# O protobuf (upb) exige bytes em campos bytes, então memoryview/mmap não evitariam a cópia.
+def _read_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        if len(data) < size:  # Leitura parcial: completa o restante
+            parts = [data]
+            remaining = size - len(data)
+            while remaining > 0:
+                part = os.read(fd, remaining)
+                if not part:
+                    break
+                parts.append(part); remaining -= len(part)
+            data = b''.join(parts)
+        return data
+    finally:
+        os.close(fd)
+
+def _publish_chunk(temp_path, path):
+    """Move o temporário para o caminho final e retorna True se o chunk não existia."""
+    try:
+        os.link(temp_path, path)  # Falha se o chunk já existe: detecta a criação sem corrida
+    except FileExistsError:
+        os.replace(temp_path, path)
+        return False
+    os.unlink(temp_path)
+    return True
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _replica_pieces(chunk_id, size, pieces):
+    # Repassa à réplica os pedaços colocados na fila até o sentinela None
+    first = True
+    while True:
+        data = pieces.get()
+        if data is None:
+            return
+        yield bigfs_pb2.Chunk(chunk_id=chunk_id, data=data, size=size) if first else bigfs_pb2.Chunk(data=data)
+        first = False
+
+# Os chunks ficam em 256 subdiretórios (00-ff) escolhidos pelo hash do chunk_id, para que
+# nenhum diretório cresça com o total de chunks do nó. O hash é necessário porque o
+# chunk_id começa pelo nome do arquivo e não se distribui sozinho.
+SHARD_DIRS = [f"{i:02x}" for i in range(256)]
+# Chunks ainda recebendo pedaços; nunca coincide com um chunk_id, que termina no plan_id
+TEMP_SUFFIX = '.part'
+
+def _shard_of(chunk_id):
+    return hashlib.blake2b(chunk_id.encode(), digest_size=1).hexdigest()
 
 class StorageService(bigfs_pb2_grpc.StorageServiceServicer):
     def __init__(self, storage_dir):
         self.storage_dir = storage_dir
         if not os.path.exists(storage_dir): os.makedirs(storage_dir)
+        self._prepare_shards()
+        # Contador de chunks mantido por StoreChunk/RemoveChunk: o heartbeat não precisa
+        # listar o diretório inteiro a cada envio
+        self._count_lock = threading.Lock()
+        self.chunk_count = sum(
+            1 for shard in SHARD_DIRS for name in os.listdir(os.path.join(storage_dir, shard))
+            if not name.endswith(TEMP_SUFFIX)
+        )
+        # Canal/stub persistente por réplica, reaproveitado por todos os chunks
+        self._replica_stubs = {}
+        self._replica_lock = threading.Lock()
+        # Replicações em andamento: o gRPC cancela a chamada se a future for coletada
+        # antes de terminar, então a referência é mantida até a conclusão
+        self._replications = set()
+        # Um slot por chunk replicado, liberado quando todos os seus streams terminam. Um
+        # slot por chunk (e não por stream) evita que dois StoreChunk segurem parte dos
+        # slots de que precisam e esperem um pelo outro.
+        self._replication_slots = threading.BoundedSemaphore(REPLICATION_MAX_CHUNKS)
+
+    def _prepare_shards(self):
+        for shard in SHARD_DIRS:
+            shard_dir = os.path.join(self.storage_dir, shard)
+            os.makedirs(shard_dir, exist_ok=True)
+            # Temporários de escritas interrompidas por uma queda do nó
+            for name in os.listdir(shard_dir):
+                if name.endswith(TEMP_SUFFIX):
+                    os.unlink(os.path.join(shard_dir, name))
+        # Migra chunks gravados no layout antigo (diretório plano)
+        with os.scandir(self.storage_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    os.replace(entry.path, self._chunk_path(entry.name))
 
-    def _replicate_chunk(self, replica_address, chunk):
+    def _chunk_path(self, chunk_id):
+        return os.path.join(self.storage_dir, _shard_of(chunk_id), chunk_id)
+
+    def _get_replica_stub(self, replica_address):
+        stub = self._replica_stubs.get(replica_address)
+        if stub is None:
+            with self._replica_lock:
+                stub = self._replica_stubs.get(replica_address)
+                if stub is None:
+                    channel = grpc.insecure_channel(replica_address, options=GRPC_OPTIONS)
+                    stub = self._replica_stubs[replica_address] = bigfs_pb2_grpc.StorageServiceStub(channel)
+        return stub
+
+    def _replicate_chunk(self, replica_addresses, chunk_id, size):
+        # Um stream por réplica, alimentado por uma fila: cada pedaço recebido é repassado
+        # assim que chega, sem montar o chunk inteiro em memória. Com os slots esgotados o
+        # StoreChunk espera aqui, segurando o stream do remetente.
+        # Falhas de replicação continuam sendo ignoradas, como antes.
+        if not replica_addresses:
+            return []
+        self._replication_slots.acquire()
+        streams = []
         try:
-            with grpc.insecure_channel(replica_address) as channel:
-                stub = bigfs_pb2_grpc.StorageServiceStub(channel)
-                replica_chunk = bigfs_pb2.Chunk(chunk_id=chunk.chunk_id, data=chunk.data)
-                stub.StoreChunk(replica_chunk, timeout=15)
-        except grpc.RpcError: pass
-
-    def StoreChunk(self, request, context):
-        chunk_path = os.path.join(self.storage_dir, request.chunk_id)
+            for replica_address in replica_addresses:
+                pieces = queue.SimpleQueue()
+                future = self._get_replica_stub(replica_address).StoreChunk.future(
+                    _replica_pieces(chunk_id, size, pieces), timeout=15
+                )
+                streams.append((pieces, future))
+        except BaseException:
+            for pieces, future in streams:
+                future.cancel()
+                pieces.put(None)
+            self._replication_slots.release()
+            raise
+        
+        remaining = [len(streams)]
+        def replication_done(future):
+            with self._replica_lock:
+                self._replications.discard(future)
+                remaining[0] -= 1
+                last = not remaining[0]
+            if last:
+                self._replication_slots.release()
+        
+        with self._replica_lock:
+            self._replications.update(future for _, future in streams)
+        for _, future in streams:
+            future.add_done_callback(replication_done)
+        return streams
+
+    def StoreChunk(self, request_iterator, context):
+        # O chunk chega em pedaços: o primeiro traz chunk_id e réplicas, e cada pedaço é
+        # gravado assim que chega num temporário do mesmo shard. O chunk só aparece no
+        # caminho final depois que o stream terminou, e um stream interrompido não
+        # trunca a versão já gravada.
+        first = next(request_iterator, None)
+        if first is None:
+            return bigfs_pb2.SimpleResponse(success=False, message="Chunk sem dados")
+        chunk_path = self._chunk_path(first.chunk_id)
+        # As réplicas recebem cada pedaço antes da escrita local: como as chamadas são
+        # assíncronas, o envio pela rede se sobrepõe à gravação em disco
+        replicas = self._replicate_chunk(first.replica_node_ids, first.chunk_id, first.size)
+        stored = False
+        temp_path = None
         try:
-            with open(chunk_path, 'wb') as f: f.write(request.data)
-            if request.replica_node_ids:
-                for replica_addr in request.replica_node_ids:
-                    threading.Thread(target=self._replicate_chunk, args=(replica_addr, request), daemon=True).start()
-            return bigfs_pb2.SimpleResponse(success=True)
+            fd, temp_path = tempfile.mkstemp(suffix=TEMP_SUFFIX, dir=os.path.dirname(chunk_path))
+            received = 0
+            try:
+                for piece in itertools.chain((first,), request_iterator):
+                    for pieces, _ in replicas:
+                        pieces.put(piece.data)
+                    _write_all(fd, piece.data)
+                    received += len(piece.data)
+            finally:
+                os.close(fd)
+            # Um cancelamento do remetente pode encerrar o stream como um fim normal
+            if received != first.size:
+                return bigfs_pb2.SimpleResponse(success=False, message="Chunk incompleto")
+            created = _publish_chunk(temp_path, chunk_path)
+            stored = True
         except IOError: return bigfs_pb2.SimpleResponse(success=False)
+        finally:
+            if not stored and temp_path is not None:
+                try:
+                    os.unlink(temp_path)
+                except FileNotFoundError:
+                    pass
+            # Sem o chunk completo, as réplicas são canceladas e descartam o que receberam
+            for pieces, future in replicas:
+                if not stored:
+                    future.cancel()
+                pieces.put(None)
+        if created:
+            with self._count_lock:
+                self.chunk_count += 1
+        return bigfs_pb2.SimpleResponse(success=True)
 
     def RetrieveChunk(self, request, context):
-        chunk_path = os.path.join(self.storage_dir, request.chunk_id)
+        chunk_path = self._chunk_path(request.chunk_id)
         try:
-            with open(chunk_path, 'rb') as f: data = f.read()
+            data = _read_file(chunk_path)
             return bigfs_pb2.Chunk(chunk_id=request.chunk_id, data=data)
         except FileNotFoundError:
             context.set_code(grpc.StatusCode.NOT_FOUND); context.set_details("Chunk não encontrado")
             return bigfs_pb2.Chunk()
 
-def send_heartbeats(node_id, storage_dir, metadata_address):
-    while True:
+    def RemoveChunk(self, request, context):
+        """
+        Remove chunk físico do disco
+        """
+        chunk_path = self._chunk_path(request.chunk_id)
+        
+        # unlink direto: sem o exists() antes, uma remoção concorrente não gera corrida
         try:
-            chunk_count = len(os.listdir(storage_dir))
-            with grpc.insecure_channel(metadata_address) as channel:
-                stub = bigfs_pb2_grpc.MetadataServiceStub(channel)
-                node_info = bigfs_pb2.NodeInfo(address=node_id, chunk_count=chunk_count)
-                stub.RegisterNode(node_info)
-        except Exception: pass
-        time.sleep(5)
-
-def RemoveChunk(self, request, context):
-    """
-    Remove chunk físico do disco
-    """
-    chunk_path = os.path.join(self.storage_dir, request.chunk_id)
-    
-    try:
-        if os.path.exists(chunk_path):
-            os.remove(chunk_path)
-            print(f"[Storage] ✅ Chunk {request.chunk_id} removido do disco")
-            return bigfs_pb2.SimpleResponse(success=True, message="Chunk removido")
-        else:
+            os.unlink(chunk_path)
+        except FileNotFoundError:
             print(f"[Storage] ⚠️  Chunk {request.chunk_id} não encontrado no disco")
             return bigfs_pb2.SimpleResponse(success=False, message="Chunk não encontrado")
-            
-    except OSError as e:
-        print(f"[Storage] ❌ Erro ao remover chunk {request.chunk_id}: {e}")
-        context.set_code(grpc.StatusCode.INTERNAL)
-        context.set_details(str(e))
-        return bigfs_pb2.SimpleResponse(success=False, message=str(e))
+        except OSError as e:
+            print(f"[Storage] ❌ Erro ao remover chunk {request.chunk_id}: {e}")
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(str(e))
+            return bigfs_pb2.SimpleResponse(success=False, message=str(e))
+        
+        with self._count_lock:
+            self.chunk_count -= 1
+        print(f"[Storage] ✅ Chunk {request.chunk_id} removido do disco")
+        return bigfs_pb2.SimpleResponse(success=True, message="Chunk removido")
+
+def send_heartbeats(node_id, service, metadata_address):
+    # Um canal persistente para todos os heartbeats, em vez de uma conexão nova a cada 5s;
+    # se uma chamada falhar, o canal é recriado no heartbeat seguinte
+    channel = stub = None
+    while True:
+        try:
+            if channel is None:
+                channel = grpc.insecure_channel(metadata_address, options=HEARTBEAT_CHANNEL_OPTIONS)
+                stub = bigfs_pb2_grpc.MetadataServiceStub(channel)
+            node_info = bigfs_pb2.NodeInfo(address=node_id, chunk_count=service.chunk_count)
+            stub.RegisterNode(node_info, timeout=HEARTBEAT_INTERVAL_SECONDS)
+        except Exception:
+            if channel is not None:
+                channel.close()
+            channel = stub = None
+        time.sleep(HEARTBEAT_INTERVAL_SECONDS)
 
 def serve(port, metadata_address, my_ip):
     node_id = f"{my_ip}:{port}"; storage_dir = f"storage_{port}"
     if not os.path.exists(storage_dir): os.makedirs(storage_dir)
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    bigfs_pb2_grpc.add_StorageServiceServicer_to_server(StorageService(storage_dir), server)
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=SERVER_WORKERS, thread_name_prefix='grpc-worker'),
+        options=SERVER_OPTIONS
+    )
+    service = StorageService(storage_dir)
+    bigfs_pb2_grpc.add_StorageServiceServicer_to_server(service, server)
     server.add_insecure_port(f'[::]:{port}'); server.start()
     print(f"📡 Storage Node '{node_id}' escutando na porta {port}.")
-    threading.Thread(target=send_heartbeats, args=(node_id, storage_dir, metadata_address), daemon=True).start()
+    threading.Thread(target=send_heartbeats, args=(node_id, service, metadata_address), daemon=True).start()
     server.wait_for_termination()
 
 if __name__ == '__main__':